@@ -1,7 +1,12 @@
 import os
 
+from django.conf import settings
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
 
 application = get_asgi_application()
+
+if settings.REFERENCE_CACHE_WARM_UP:
+    from recipes.views import warm_up_reference_cache
+    warm_up_reference_cache()
@@ -0,0 +1,119 @@
+import gzip
+import hashlib
+import io
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.cache import patch_vary_headers
+from django.utils.deprecation import MiddlewareMixin
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSED_KEY = 'compressed:{encoding}:{digest}'
+
+
+def gzip_compress(content, level):
+    # mtime=0, чтобы одинаковое содержимое давало одинаковые байты.
+    buffer = io.BytesIO()
+    with gzip.GzipFile(mode='wb', compresslevel=level,
+                       fileobj=buffer, mtime=0) as file:
+        file.write(content)
+    return buffer.getvalue()
+
+
+def brotli_compress(content, level):
+    return brotli.compress(content, quality=level)
+
+
+COMPRESSORS = {'br': brotli_compress, 'gzip': gzip_compress}
+
+
+def get_available_encodings():
+    """ Поддерживаемые кодировки в порядке предпочтения сервера. """
+    return [encoding for encoding in settings.COMPRESSION_ENCODINGS
+            if encoding != 'br' or brotli is not None]
+
+
+def parse_accept_encoding(header):
+    """ Кодировки из Accept-Encoding с их q-значениями. """
+    weights = {}
+    for item in header.split(','):
+        encoding, *params = item.strip().split(';')
+        encoding = encoding.strip().lower()
+        if not encoding:
+            continue
+        weight = 1.0
+        for param in params:
+            name, _, value = param.strip().partition('=')
+            if name.strip() == 'q':
+                try:
+                    weight = float(value)
+                except ValueError:
+                    weight = 0.0
+        weights[encoding] = weight
+    return weights
+
+
+def negotiate_encoding(header):
+    """ Кодировка с наибольшим q, при равенстве - по порядку сервера. """
+    weights = parse_accept_encoding(header)
+    best, best_weight = None, 0.0
+    for encoding in get_available_encodings():
+        weight = weights.get(encoding, weights.get('*', 0.0))
+        if weight > best_weight:
+            best, best_weight = encoding, weight
+    return best
+
+
+class CompressionMiddleware(MiddlewareMixin):
+    """ Сжимает большие ответы в brotli или gzip по Accept-Encoding.
+        Для ответов с ETag (справочники) сжатое тело кэшируется
+        по хэшу несжатого тела, и одинаковые ответы сжимаются один раз. """
+
+    def process_response(self, request, response):
+        if not self.is_compressible(response):
+            return response
+        patch_vary_headers(response, ('Accept-Encoding',))
+        encoding = negotiate_encoding(
+            request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        if encoding is None:
+            return response
+        etag = response.get('ETag')
+        if etag:
+            content = self.get_cached(response, encoding)
+        else:
+            content = COMPRESSORS[encoding](
+                response.content, settings.COMPRESSION_LEVELS[encoding])
+        if len(content) >= len(response.content):
+            return response
+        response.content = content
+        response['Content-Length'] = str(len(content))
+        response['Content-Encoding'] = encoding
+        if etag and etag.startswith('"'):
+            # Сжатое тело отличается побайтно, ETag становится слабым.
+            response['ETag'] = 'W/' + etag
+        return response
+
+    def is_compressible(self, response):
+        if response.streaming or response.has_header('Content-Encoding'):
+            return False
+        if len(response.content) < settings.COMPRESSION_MIN_SIZE:
+            return False
+        content_type = response.get('Content-Type', '').split(';')[0]
+        return content_type in settings.COMPRESSION_CONTENT_TYPES
+
+    def get_cached(self, response, encoding):
+        # ETag одинаков для всех пользователей и форматов, а тело
+        # страницы Browsable API содержит имя пользователя и CSRF токен.
+        digest = hashlib.sha256(response.content).hexdigest()
+        key = COMPRESSED_KEY.format(encoding=encoding, digest=digest)
+        content = cache.get(key)
+        if content is None:
+            content = COMPRESSORS[encoding](
+                response.content,
+                settings.COMPRESSION_CACHED_LEVELS[encoding])
+            cache.set(key, content, settings.COMPRESSION_CACHE_TIMEOUT)
+        return content
@@ -0,0 +1,36 @@
+import time
+
+from django import db
+from django.conf import settings
+from django.core.signals import request_started
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+
+def check_connections(**kwargs):
+    """ Проверяет постоянные соединения не чаще, чем раз
+        в DB_HEALTH_CHECK_INTERVAL секунд, и закрывает оборванные,
+        чтобы запрос открыл новое вместо ошибки. """
+    now = time.monotonic()
+    for connection in connections.all():
+        if connection.connection is None or connection.in_atomic_block:
+            continue
+        checked = getattr(connection, 'health_checked_at', 0)
+        if now - checked < settings.DB_HEALTH_CHECK_INTERVAL:
+            continue
+        connection.health_checked_at = now
+        if not connection.is_usable():
+            connection.close()
+
+
+def close_old_connections(**kwargs):
+    db.close_old_connections()
+    check_connections()
+
+
+def connection_opened(sender, connection, **kwargs):
+    connection.health_checked_at = time.monotonic()
+
+
+request_started.connect(check_connections)
+connection_created.connect(connection_opened)
@@ -0,0 +1,98 @@
+import threading
+
+import psycopg2.extras
+from django.db.backends.postgresql import base
+from psycopg2 import pool
+
+Database = base.Database
+
+pools = {}
+pools_lock = threading.Lock()
+
+
+def is_usable(connection):
+    """ Проверяет соединение перед выдачей из пула: после перезапуска
+        базы или обрыва сети оно может быть закрыто. """
+    if connection.closed:
+        return False
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT 1')
+        if not connection.autocommit:
+            # Django включает autocommit уже после выдачи соединения.
+            connection.rollback()
+    except Database.Error:
+        return False
+    return True
+
+
+class ConnectionPool:
+    """ Пул соединений процесса. Если свободных соединений нет,
+        ждет POOL_TIMEOUT секунд, а не падает сразу. Оборванные
+        соединения отбрасываются при выдаче. """
+
+    def __init__(self, min_size, max_size, timeout, params):
+        self.pool = pool.ThreadedConnectionPool(min_size, max_size, **params)
+        self.slots = threading.BoundedSemaphore(max_size)
+        self.timeout = timeout
+
+    def getconn(self):
+        if not self.slots.acquire(timeout=self.timeout):
+            raise Database.OperationalError(
+                'No free connections in the pool')
+        try:
+            while True:
+                connection = self.pool.getconn()
+                if is_usable(connection):
+                    return connection
+                # Соединение, оборванное в пуле, закрывается, берется
+                # следующее. Новое соединение при ошибке бросит исключение.
+                self.pool.putconn(connection, close=True)
+        except Exception:
+            self.slots.release()
+            raise
+
+    def putconn(self, connection, close=False):
+        try:
+            self.pool.putconn(connection, close=close)
+        finally:
+            self.slots.release()
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """ PostgreSQL с пулом соединений внутри воркера. Закрытие
+        соединения в конце запроса возвращает его в пул. """
+
+    def get_pool(self, conn_params):
+        with pools_lock:
+            connection_pool = pools.get(self.alias)
+            if connection_pool is None:
+                connection_pool = pools[self.alias] = ConnectionPool(
+                    self.settings_dict.get('POOL_MIN_SIZE', 1),
+                    self.settings_dict.get('POOL_MAX_SIZE', 10),
+                    self.settings_dict.get('POOL_TIMEOUT', 5),
+                    conn_params)
+        return connection_pool
+
+    def get_new_connection(self, conn_params):
+        self.pool = self.get_pool(conn_params)
+        connection = self.pool.getconn()
+        # Как в базовом backend'е, но соединение взято из пула.
+        options = self.settings_dict['OPTIONS']
+        try:
+            self.isolation_level = options['isolation_level']
+        except KeyError:
+            self.isolation_level = connection.isolation_level
+        else:
+            if self.isolation_level != connection.isolation_level:
+                connection.set_session(isolation_level=self.isolation_level)
+        psycopg2.extras.register_default_jsonb(
+            conn_or_curs=connection, loads=lambda value: value)
+        return connection
+
+    def _close(self):
+        if self.connection is not None:
+            with self.wrap_database_errors:
+                # Соединение после ошибки могло оборваться, его не берем.
+                self.pool.putconn(self.connection,
+                                  close=self.errors_occurred)
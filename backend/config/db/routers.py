@@ -0,0 +1,53 @@
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+
+PRIMARY_PIN_KEY = 'db_primary_pin:{user_id}'
+
+use_replica = ContextVar('use_replica', default=False)
+
+
+@contextmanager
+def read_from_primary():
+    """ Чтения внутри блока идут в основную базу. Нужно, когда
+        результат попадает в кэш под версией, которая меняется после
+        коммита в основной базе: отставшая реплика сохранила бы
+        под новой версией старые данные. """
+    token = use_replica.set(False)
+    try:
+        yield
+    finally:
+        use_replica.reset(token)
+
+
+def pin_to_primary(user_id):
+    """ После записи чтения пользователя какое-то время идут
+        в основную базу, чтобы он не увидел отставшую реплику. """
+    cache.set(PRIMARY_PIN_KEY.format(user_id=user_id), True,
+              settings.DB_REPLICA_PIN_SECONDS)
+
+
+def is_pinned_to_primary(user_id):
+    return cache.get(PRIMARY_PIN_KEY.format(user_id=user_id), False)
+
+
+class ReplicaRouter:
+    """ Отправляет чтения в реплики, если их разрешил use_replica,
+        все остальное идет в default. """
+
+    def db_for_read(self, model, **hints):
+        if use_replica.get() and settings.DATABASE_REPLICAS:
+            return random.choice(settings.DATABASE_REPLICAS)
+        return 'default'
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == 'default'
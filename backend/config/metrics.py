@@ -0,0 +1,118 @@
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                    1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (1, 2, 3, 5, 10, 20, 50, 100, 200)
+
+
+def escape(value):
+    return (str(value).replace('\\', '\\\\')
+            .replace('"', '\\"').replace('\n', '\\n'))
+
+
+class Histogram:
+    """ Гистограмма в формате Prometheus с набором меток. """
+
+    def __init__(self, name, documentation, buckets):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = buckets
+        self.series = defaultdict(
+            lambda: [[0] * len(self.buckets), 0.0, 0])
+
+    def observe(self, labels, value):
+        counts, _, _ = series = self.series[labels]
+        for position, bound in enumerate(self.buckets):
+            if value <= bound:
+                counts[position] += 1
+        series[1] += value
+        series[2] += 1
+
+    def render(self):
+        yield f'# HELP {self.name} {self.documentation}'
+        yield f'# TYPE {self.name} histogram'
+        for labels, (counts, total, count) in sorted(self.series.items()):
+            names = ','.join(f'{key}="{escape(value)}"'
+                             for key, value in labels)
+            prefix = f'{names},' if names else ''
+            for bound, bucket_count in zip(self.buckets, counts):
+                yield (f'{self.name}_bucket{{{prefix}le="{bound}"}} '
+                       f'{bucket_count}')
+            yield f'{self.name}_bucket{{{prefix}le="+Inf"}} {count}'
+            yield f'{self.name}_sum{{{names}}} {total}'
+            yield f'{self.name}_count{{{names}}} {count}'
+
+
+class Counter:
+
+    def __init__(self, name, documentation):
+        self.name = name
+        self.documentation = documentation
+        self.series = defaultdict(int)
+
+    def inc(self, labels):
+        self.series[labels] += 1
+
+    def render(self):
+        yield f'# HELP {self.name} {self.documentation}'
+        yield f'# TYPE {self.name} counter'
+        for labels, value in sorted(self.series.items()):
+            names = ','.join(f'{key}="{escape(value)}"'
+                             for key, value in labels)
+            yield f'{self.name}{{{names}}} {value}'
+
+
+class RequestMetrics:
+    """ Метрики запросов по endpoint'ам. Хранятся в памяти процесса,
+        каждый воркер отдает свои значения. """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = Counter(
+            'foodgram_requests_total', 'Number of requests.')
+        self.duration = Histogram(
+            'foodgram_request_duration_seconds',
+            'Total request time.', DURATION_BUCKETS)
+        self.db_duration = Histogram(
+            'foodgram_request_db_seconds',
+            'Time spent in database queries.', DURATION_BUCKETS)
+        self.render_duration = Histogram(
+            'foodgram_request_render_seconds',
+            'Time spent rendering the response body.', DURATION_BUCKETS)
+        self.queries = Histogram(
+            'foodgram_request_queries',
+            'Number of database queries per request.', QUERY_BUCKETS)
+
+    def observe(self, endpoint, method, status, total, db, render, queries):
+        labels = (('endpoint', endpoint), ('method', method))
+        with self._lock:
+            self.requests.inc(labels + (('status', status),))
+            self.duration.observe(labels, total)
+            self.db_duration.observe(labels, db)
+            self.render_duration.observe(labels, render)
+            self.queries.observe(labels, queries)
+
+    def render(self):
+        with self._lock:
+            lines = [line for metric in (self.requests, self.duration,
+                                         self.db_duration,
+                                         self.render_duration, self.queries)
+                     for line in metric.render()]
+        return '\n'.join(lines) + '\n'
+
+
+request_metrics = RequestMetrics()
+
+
+def metrics_view(request):
+    """ Метрики в текстовом формате Prometheus. Если задан
+        METRICS_TOKEN, нужен заголовок Authorization: Bearer <token>. """
+    token = getattr(settings, 'METRICS_TOKEN', None)
+    if token and request.headers.get('Authorization') != f'Bearer {token}':
+        return HttpResponseForbidden()
+    return HttpResponse(request_metrics.render(),
+                        content_type='text/plain; version=0.0.4')
@@ -0,0 +1,153 @@
+import asyncio
+import logging
+import time
+from collections import Counter
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+from .metrics import request_metrics
+
+logger = logging.getLogger(__name__)
+
+current_recorder = ContextVar('current_recorder', default=None)
+
+
+class QueryBudgetExceeded(AssertionError):
+    """ Endpoint выполнил больше запросов, чем разрешено в QUERY_BUDGETS. """
+
+
+class QueryRecorder:
+    """ Считает запросы к базе и время их выполнения. """
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.statements = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.count += 1
+            self.statements[sql] += 1
+
+    def repeated(self, limit=5):
+        return [(sql, count)
+                for sql, count in self.statements.most_common(limit)
+                if count > 1]
+
+
+def record_query(execute, sql, params, many, context):
+    recorder = current_recorder.get()
+    if recorder is None:
+        return execute(sql, params, many, context)
+    return recorder(execute, sql, params, many, context)
+
+
+def install_query_recorder(sender, connection, **kwargs):
+    # Обертка ставится на каждое соединение, а запрос находит свой
+    # счетчик через contextvar, в том числе из потоков sync_to_async.
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+connection_created.connect(install_query_recorder)
+
+
+def get_endpoint(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unresolved'
+    return match.view_name or match.route
+
+
+class RequestMetricsMiddleware:
+    """ Собирает число запросов к базе, время базы, рендеринга
+        и общее время по каждому endpoint'у. Медленные запросы
+        пишутся в лог вместе с повторяющимся SQL. """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        for connection in connections.all():
+            install_query_recorder(None, connection)
+        if asyncio.iscoroutinefunction(get_response):
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        if request.path == settings.METRICS_URL:
+            return self.get_response(request)
+        token, start = self.start(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            recorder = self.stop(token)
+        self.finish(request, response, recorder, start)
+        return response
+
+    async def __acall__(self, request):
+        if request.path == settings.METRICS_URL:
+            return await self.get_response(request)
+        token, start = self.start(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            recorder = self.stop(token)
+        self.finish(request, response, recorder, start)
+        return response
+
+    def start(self, request):
+        request._render_duration = 0.0
+        return current_recorder.set(QueryRecorder()), time.perf_counter()
+
+    def stop(self, token):
+        recorder = current_recorder.get()
+        current_recorder.reset(token)
+        return recorder
+
+    def finish(self, request, response, recorder, start):
+        total = time.perf_counter() - start
+        endpoint = get_endpoint(request)
+        request_metrics.observe(
+            endpoint, request.method, response.status_code,
+            total, recorder.duration, request._render_duration,
+            recorder.count)
+        if total >= settings.SLOW_REQUEST_THRESHOLD:
+            logger.warning(
+                'Slow request %s %s: %.3fs, %d queries (%.3fs), '
+                'repeated SQL: %s',
+                request.method, request.get_full_path(), total,
+                recorder.count, recorder.duration, recorder.repeated())
+        self.check_budget(request, endpoint, recorder)
+
+    def process_template_response(self, request, response):
+        # DRF отрисовывает ответ после выхода из view.
+        start = time.perf_counter()
+
+        def rendered(response):
+            request._render_duration = time.perf_counter() - start
+
+        response.add_post_render_callback(rendered)
+        return response
+
+    def check_budget(self, request, endpoint, recorder):
+        budgets = settings.QUERY_BUDGETS
+        budget = budgets.get(f'{request.method} {endpoint}',
+                             budgets.get(endpoint))
+        if budget is None or recorder.count <= budget:
+            return
+        message = (f'{request.method} {endpoint}: {recorder.count} '
+                   f'queries, budget {budget}, '
+                   f'repeated SQL: {recorder.repeated()}')
+        if settings.QUERY_BUDGET_STRICT:
+            raise QueryBudgetExceeded(message)
+        logger.warning('Query budget exceeded: %s', message)
@@ -54,6 +54,7 @@ DJOSER = {
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'config.compression.CompressionMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -62,6 +63,11 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+REQUEST_METRICS = os.getenv('REQUEST_METRICS', default='True') == 'True'
+
+if REQUEST_METRICS:
+    MIDDLEWARE.insert(0, 'config.middleware.RequestMetricsMiddleware')
+
 AUTH_USER_MODEL = 'users.CustomUser'
 ROOT_URLCONF = 'config.urls'
 
@@ -83,17 +89,45 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'config.wsgi.application'
 
+# Пул соединений внутри воркера, только для PostgreSQL.
+DB_POOL = os.getenv('DB_POOL', default='False') == 'True'
+
 DATABASES = {
     'default': {
-        'ENGINE': os.getenv('DB_ENGINE'),
+        'ENGINE': 'config.db.backends.postgresql_pool' if DB_POOL else os.getenv('DB_ENGINE'),
         'NAME': os.getenv('DB_NAME'),
         'USER': os.getenv('POSTGRES_USER'),
         'PASSWORD': os.getenv('POSTGRES_PASSWORD'),
         'HOST': os.getenv('DB_HOST'),
-        'PORT': os.getenv('DB_PORT')
+        'PORT': os.getenv('DB_PORT'),
+        # С пулом соединение возвращается в пул в конце каждого запроса.
+        'CONN_MAX_AGE': 0 if DB_POOL else int(os.getenv('DB_CONN_MAX_AGE', default=60)),
+        'POOL_MIN_SIZE': int(os.getenv('DB_POOL_MIN_SIZE', default=1)),
+        'POOL_MAX_SIZE': int(os.getenv('DB_POOL_MAX_SIZE', default=10)),
+        'POOL_TIMEOUT': float(os.getenv('DB_POOL_TIMEOUT', default=5)),
     }
 }
 
+DB_HEALTH_CHECK_INTERVAL = int(os.getenv('DB_HEALTH_CHECK_INTERVAL', default=10))
+
+# Реплики для чтения: DB_REPLICA_HOSTS=host1,host2
+DATABASE_REPLICAS = []
+
+for number, host in enumerate(filter(None, os.getenv('DB_REPLICA_HOSTS', default='').split(','))):
+    DATABASES[f'replica{number}'] = {
+        **DATABASES['default'], 'HOST': host, 'TEST': {'MIRROR': 'default'}}
+    DATABASE_REPLICAS.append(f'replica{number}')
+
+DATABASE_ROUTERS = ['config.db.routers.ReplicaRouter']
+
+DB_REPLICA_PIN_SECONDS = int(os.getenv('DB_REPLICA_PIN_SECONDS', default=5))
+
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', default='foodgram'),
+    }
+}
 
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -132,10 +166,136 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': ['rest_framework.permissions.AllowAny', ],
+    'DEFAULT_RENDERER_CLASSES': [
+        'config.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
-        'rest_framework.authentication.BasicAuthentication',
+        'users.authentication.CachedTokenAuthentication',
+        'users.authentication.CachedBasicAuthentication',
     ],
     'DEFAULT_FILTER_BACKENDS': [
         'django_filters.rest_framework.DjangoFilterBackend'],
 }
+
+AUTH_CACHE_TIMEOUT = int(os.getenv('AUTH_CACHE_TIMEOUT', default=60 * 5))
+
+# Локальный кэш процесса, после выхода в других процессах
+# пользователь остается аутентифицированным не дольше этого времени.
+AUTH_LOCAL_CACHE_TIMEOUT = int(os.getenv('AUTH_LOCAL_CACHE_TIMEOUT', default=5))
+
+AUTH_LOCAL_CACHE_SIZE = 1024
+
+SHOPPING_LIST_EXPORTERS = [
+    'recipes.exporters.TextExporter',
+    'recipes.exporters.CsvExporter',
+    'recipes.exporters.PdfExporter',
+]
+
+SHOPPING_LIST_CACHE_TIMEOUT = 60 * 60 * 24
+
+INGREDIENT_SEARCH_LIMIT = int(os.getenv('INGREDIENT_SEARCH_LIMIT', default=50))
+
+REFERENCE_CACHE_TIMEOUT = int(os.getenv('REFERENCE_CACHE_TIMEOUT', default=60 * 60 * 6))
+
+REFERENCE_CACHE_WARM_UP = os.getenv('REFERENCE_CACHE_WARM_UP', default='True') == 'True'
+
+CURSOR_PAGINATION_COUNT_TIMEOUT = 60
+
+RECIPE_IMAGE_FORMAT = 'JPEG'
+
+RECIPE_IMAGE_QUALITY = 85
+
+RECIPE_IMAGE_MAX_SIZE = 1280
+
+RECIPE_THUMBNAIL_SIZES = {
+    'small': (320, 240),
+    'medium': (640, 480),
+}
+
+# Фоновые задачи после коммита: обработка изображений, раскладка лент.
+# Очередь хранится в памяти процесса, задачи теряются при перезапуске
+# воркера: ленты подписок восстанавливает периодический rebuild_feed.
+BACKGROUND_JOBS_ASYNC = os.getenv('BACKGROUND_JOBS_ASYNC', default='True') == 'True'
+
+BACKGROUND_JOBS_WORKERS = int(os.getenv('BACKGROUND_JOBS_WORKERS', default=2))
+
+RECIPE_FEED_CACHE = True
+
+TEST_RUNNER = 'config.test_runner.TestRunner'
+
+RECIPE_FEED_CACHE_TIMEOUT = 60 * 5
+
+# Исходное изображение удаляется после обработки с задержкой,
+# пока на него могут ссылаться уже отданные ответы.
+RECIPE_IMAGE_DELETE_DELAY = RECIPE_FEED_CACHE_TIMEOUT + 60
+
+# Чтение рецептов через .values() без создания моделей.
+FAST_RECIPE_SERIALIZATION = os.getenv(
+    'FAST_RECIPE_SERIALIZATION', default='True') == 'True'
+
+POPULARITY_HALF_LIFE_HOURS = 72
+
+POPULARITY_WEIGHTS = {
+    'favorite': 1.0,
+    'shopping_cart': 1.5,
+}
+
+POPULARITY_MIN_SCORE = 0.001
+
+# Перекрытие пересчетов для событий, закоммиченных после прошлого.
+POPULARITY_OVERLAP_SECONDS = 60 * 5
+
+BULK_RECIPES_LIMIT = int(os.getenv('BULK_RECIPES_LIMIT', default=500))
+
+# Рецепты авторов с таким числом подписчиков не раскладываются
+# по лентам при публикации, а подмешиваются при чтении ленты.
+FEED_FANOUT_LIMIT = int(os.getenv('FEED_FANOUT_LIMIT', default=10000))
+
+# Сколько последних рецептов автора попадает в ленту при подписке.
+FEED_BACKFILL_SIZE = 100
+
+FEED_BATCH_SIZE = 1000
+
+FEED_CELEBRITIES_TIMEOUT = 60
+
+METRICS_URL = '/metrics/'
+
+METRICS_TOKEN = os.getenv('METRICS_TOKEN')
+
+# Сжатие ответов, br используется при установленном brotli.
+COMPRESSION_ENCODINGS = ['br', 'gzip']
+
+COMPRESSION_MIN_SIZE = int(os.getenv('COMPRESSION_MIN_SIZE', default=1024))
+
+COMPRESSION_CONTENT_TYPES = {
+    'application/json', 'text/plain', 'text/csv', 'text/html',
+}
+
+COMPRESSION_LEVELS = {'br': 4, 'gzip': 6}
+
+# Тела с ETag сжимаются один раз, поэтому уровень выше.
+COMPRESSION_CACHED_LEVELS = {'br': 11, 'gzip': 9}
+
+COMPRESSION_CACHE_TIMEOUT = 60 * 60 * 24
+
+SLOW_REQUEST_THRESHOLD = float(os.getenv('SLOW_REQUEST_THRESHOLD', default=1.0))
+
+# Допустимое число запросов к базе: 'view_name' или 'METHOD view_name'.
+QUERY_BUDGETS = {
+    'GET resipes-list': 10,
+    'GET resipes-detail': 8,
+    'GET resipes-trending': 10,
+    'GET resipes-feed': 9,
+    'GET users-user-subscriptions': 8,
+    'GET tags-list': 4,
+    'GET ingredients-list': 4,
+}
+
+QUERY_BUDGET_STRICT = os.getenv('QUERY_BUDGET_STRICT', default='False') == 'True'
+
+# Асинхронные view чтения, включается при запуске через ASGI.
+ASYNC_READ_VIEWS = os.getenv('ASYNC_READ_VIEWS', default='False') == 'True'
+
+# Не больше соединений в пуле: лишние потоки только ждали бы соединение.
+ASYNC_READ_THREADS = int(os.getenv('ASYNC_READ_THREADS', default=DATABASES['default']['POOL_MAX_SIZE']))
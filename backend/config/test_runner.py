@@ -0,0 +1,12 @@
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+
+
+class TestRunner(DiscoverRunner):
+    """ Фоновые задачи в тестах выполняются сразу после коммита
+        в потоке теста, а не в пуле потоков: иначе они обращаются
+        к базе параллельно с тестом и после его отката. """
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        settings.BACKGROUND_JOBS_ASYNC = False
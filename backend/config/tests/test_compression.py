@@ -0,0 +1,30 @@
+import gzip
+
+from django.core.cache import cache
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from recipes.tests.base import make_ingredient, make_user
+
+
+class CompressionCacheTest(TestCase):
+    """ Сжатое тело из кэша не попадает к другому пользователю. """
+
+    def setUp(self):
+        cache.clear()
+        make_ingredient('соль')
+
+    def get_page(self, user):
+        client = APIClient()
+        client.force_authenticate(user)
+        response = client.get('/api/ingredients/?format=api',
+                              HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        return gzip.decompress(response.content).decode('utf-8')
+
+    def test_same_request_by_two_users(self):
+        self.assertIn('alice', self.get_page(make_user('alice')))
+        page = self.get_page(make_user('bob'))
+        self.assertIn('bob', page)
+        self.assertNotIn('alice', page)
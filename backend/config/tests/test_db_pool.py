@@ -0,0 +1,71 @@
+from unittest import TestCase
+
+from config.db.backends.postgresql_pool.base import ConnectionPool, Database
+
+
+class FakeCursor:
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    def execute(self, sql):
+        if self.connection.broken:
+            raise Database.OperationalError('server closed the connection')
+
+
+class FakeConnection:
+
+    def __init__(self, closed=0, broken=False):
+        self.closed = closed
+        self.broken = broken
+        self.autocommit = True
+
+    def cursor(self):
+        return FakeCursor(self)
+
+
+class FakePool:
+    """ Свободные соединения выдаются по порядку, затем новые. """
+
+    def __init__(self, idle):
+        self.idle = list(idle)
+        self.discarded = []
+
+    def getconn(self):
+        return self.idle.pop(0) if self.idle else FakeConnection()
+
+    def putconn(self, connection, close=False):
+        if close:
+            self.discarded.append(connection)
+        else:
+            self.idle.append(connection)
+
+
+class ConnectionPoolTest(TestCase):
+
+    def make_pool(self, idle, max_size=2):
+        connection_pool = ConnectionPool(0, max_size, 0.01, {})
+        connection_pool.pool = FakePool(idle)
+        return connection_pool
+
+    def test_broken_connections_are_discarded(self):
+        closed = FakeConnection(closed=1)
+        broken = FakeConnection(broken=True)
+        alive = FakeConnection()
+        connection_pool = self.make_pool([closed, broken, alive])
+        self.assertIs(connection_pool.getconn(), alive)
+        self.assertEqual(connection_pool.pool.discarded, [closed, broken])
+
+    def test_exhausted_pool_waits_and_fails(self):
+        connection_pool = self.make_pool([], max_size=1)
+        connection = connection_pool.getconn()
+        with self.assertRaises(Database.OperationalError):
+            connection_pool.getconn()
+        connection_pool.putconn(connection)
+        self.assertIs(connection_pool.getconn(), connection)
@@ -0,0 +1,47 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from recipes.models import ShopList
+from recipes.tests.base import make_ingredient, make_recipe, make_user
+
+
+@override_settings(DATABASE_REPLICAS=['replica0'], RECIPE_FEED_CACHE=True)
+class ReplicaCacheFillTest(TestCase):
+    """ Данные для кэшей с версиями читаются из основной базы. """
+
+    def setUp(self):
+        cache.clear()
+        self.user = make_user('reader')
+        self.recipe = make_recipe(make_user('author'), 'soup', ingredients=[
+            (make_ingredient('соль'), 5)])
+        ShopList.objects.create(user=self.user, recipe=self.recipe)
+        self.client = APIClient()
+        # Реплики в тестах нет, вместо нее отдается основная база.
+        patcher = mock.patch('config.db.routers.random.choice',
+                             return_value='default')
+        self.choice = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def assert_primary(self, path, user=None):
+        self.client.force_authenticate(user)
+        self.assertEqual(self.client.get(path).status_code, 200)
+        self.choice.assert_not_called()
+
+    def test_reference_cache_miss(self):
+        self.assert_primary('/api/ingredients/?name=со')
+
+    def test_recipe_feed_cache_miss(self):
+        self.assert_primary('/api/recipes/', self.user)
+
+    def test_shopping_cart(self):
+        self.assert_primary('/api/recipes/download_shopping_cart/',
+                            self.user)
+        self.assert_primary('/api/recipes/shopping_cart/summary/',
+                            self.user)
+
+    def test_uncached_read_uses_replica(self):
+        self.client.get(f'/api/recipes/{self.recipe.pk}/')
+        self.choice.assert_called()
@@ -16,9 +16,10 @@ class IngredientAdmin(admin.ModelAdmin):
 
 
 class RecipesAdmin(admin.ModelAdmin):
-    list_display = ('name', 'author_id', 'cooking_time',)
+    list_display = ('name', 'author_id', 'cooking_time', 'favorites_count',)
     filter_horizontal = ['tags', 'ingredients']
     search_fields = ('name',)
+    readonly_fields = ('favorites_count', 'carts_count',)
 
 
 
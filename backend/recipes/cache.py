@@ -0,0 +1,116 @@
+import hashlib
+import time
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import cache
+
+from config.db.routers import read_from_primary
+from .models import Tag
+
+SHOPPING_LIST_VERSION_KEY = 'shopping_list_version:{user_id}'
+SHOPPING_LIST_KEY = 'shopping_list:{user_id}:{version}:{format}'
+REFERENCE_VERSION_KEY = 'reference_version:{name}'
+REFERENCE_KEY = 'reference:{name}:{version}:{path}'
+TAG_IDS_KEY = 'tag_ids:{version}'
+RECIPE_FEED_VERSION_KEY = 'recipe_feed_version'
+RECIPE_FEED_KEY = 'recipe_feed:{version}:{request}'
+USER_STATE_VERSION_KEY = 'user_state_version:{user_id}'
+RECIPE_OVERLAY_KEY = 'recipe_overlay:{user_id}:{version}:{feed_key}'
+
+
+def get_version(key, timeout=None):
+    """ Версия набора данных в кэше. Версия случайная, поэтому после
+        вытеснения или истечения ключа старые записи не станут снова
+        актуальными. """
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, uuid4().hex, timeout)
+        version = cache.get(key)
+    return version
+
+
+def bump_version(key, timeout=None):
+    cache.set(key, uuid4().hex, timeout)
+
+
+def get_shopping_list_key(user_id, file_format):
+    version = get_version(SHOPPING_LIST_VERSION_KEY.format(user_id=user_id))
+    return SHOPPING_LIST_KEY.format(
+        user_id=user_id, version=version, format=file_format)
+
+
+def invalidate_shopping_list(*user_ids):
+    for user_id in user_ids:
+        bump_version(SHOPPING_LIST_VERSION_KEY.format(user_id=user_id))
+
+
+def cache_stream(key, chunks):
+    """ Отдает части файла и сохраняет его в кэш,
+        если ответ был отправлен полностью. """
+    content = []
+    for chunk in chunks:
+        content.append(chunk)
+        yield chunk
+    cache.set(key, b''.join(content),
+              getattr(settings, 'SHOPPING_LIST_CACHE_TIMEOUT', None))
+
+
+def get_reference_version(name):
+    """ Версия справочника и время его последнего изменения. """
+    key = REFERENCE_VERSION_KEY.format(name=name)
+    state = cache.get(key)
+    if state is None:
+        cache.add(key, (uuid4().hex, int(time.time())), None)
+        state = cache.get(key)
+    return state
+
+
+def invalidate_reference(name):
+    cache.set(REFERENCE_VERSION_KEY.format(name=name),
+              (uuid4().hex, int(time.time())), None)
+
+
+def get_reference_key(name, version, path):
+    return REFERENCE_KEY.format(
+        name=name, version=version,
+        path=hashlib.md5(path.encode('utf-8')).hexdigest())
+
+
+def get_tag_ids():
+    """ Соответствие slug -> id тегов. Сбрасывается вместе
+        с версией справочника тегов. """
+    version, _ = get_reference_version('tags')
+    key = TAG_IDS_KEY.format(version=version)
+    tag_ids = cache.get(key)
+    if tag_ids is None:
+        with read_from_primary():
+            tag_ids = dict(Tag.objects.values_list('slug', 'id'))
+        cache.set(key, tag_ids, settings.REFERENCE_CACHE_TIMEOUT)
+    return tag_ids
+
+
+def get_recipe_feed_key(request):
+    """ Ключ общей для всех пользователей части ленты рецептов. """
+    query = sorted((name, sorted(values))
+                   for name, values in request.query_params.lists())
+    digest = hashlib.md5(
+        f'{request.get_host()}{request.path}{query}'.encode('utf-8')
+    ).hexdigest()
+    return RECIPE_FEED_KEY.format(
+        version=get_version(RECIPE_FEED_VERSION_KEY), request=digest)
+
+
+def invalidate_recipe_feed():
+    bump_version(RECIPE_FEED_VERSION_KEY)
+
+
+def get_recipe_overlay_key(user_id, feed_key):
+    version = get_version(USER_STATE_VERSION_KEY.format(user_id=user_id))
+    return RECIPE_OVERLAY_KEY.format(
+        user_id=user_id, version=version, feed_key=feed_key)
+
+
+def invalidate_user_state(*user_ids):
+    for user_id in user_ids:
+        bump_version(USER_STATE_VERSION_KEY.format(user_id=user_id))
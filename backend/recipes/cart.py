@@ -0,0 +1,100 @@
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Sum, Value, When
+
+from .models import RecipeIngredient, ShopList, ShoppingCartIngredient
+
+
+def change_cart_totals(user_ids, deltas):
+    """ Меняет суммы ингредиентов в списках покупок пользователей
+        на deltas {ingredient_id: изменение} тремя запросами. """
+    deltas = {pk: delta for pk, delta in deltas.items() if delta}
+    user_ids = list(user_ids)
+    if not deltas or not user_ids:
+        return
+    added = [pk for pk, delta in deltas.items() if delta > 0]
+    ShoppingCartIngredient.objects.bulk_create([
+        ShoppingCartIngredient(user_id=user_id, ingredient_id=pk)
+        for user_id in user_ids for pk in added
+    ], ignore_conflicts=True)
+    rows = ShoppingCartIngredient.objects.filter(
+        user_id__in=user_ids, ingredient_id__in=deltas)
+    rows.update(total_amount=F('total_amount') + Case(
+        *[When(ingredient_id=pk, then=Value(delta))
+          for pk, delta in deltas.items()],
+        output_field=IntegerField()))
+    if len(added) < len(deltas):
+        rows.filter(total_amount__lte=0).delete()
+
+
+def get_recipe_totals(recipe_ids):
+    return dict(RecipeIngredient.objects.filter(
+        recipe_id__in=recipe_ids
+    ).values_list('ingredient_id').annotate(
+        total=Sum('amount')).order_by())
+
+
+def add_to_cart_totals(user_id, recipe_ids):
+    change_cart_totals([user_id], get_recipe_totals(recipe_ids))
+
+
+def remove_from_cart_totals(user_id, recipe_ids):
+    change_cart_totals([user_id], {
+        pk: -total for pk, total in get_recipe_totals(recipe_ids).items()})
+
+
+def change_recipe_totals(recipe_id, deltas):
+    """ Изменение ингредиентов рецепта во всех списках покупок,
+        где он есть. """
+    if deltas:
+        change_cart_totals(ShopList.objects.filter(
+            recipe_id=recipe_id).values_list('user_id', flat=True), deltas)
+
+
+def get_cart_totals(user):
+    """ Список покупок пользователя одним запросом по индексу. """
+    return ShoppingCartIngredient.objects.filter(
+        user=user, total_amount__gt=0
+    ).values(
+        'ingredient_id', 'ingredient__name', 'ingredient__measurement_unit'
+    ).annotate(
+        amount=F('total_amount')
+    ).order_by('ingredient__name', 'ingredient__measurement_unit')
+
+
+def get_expected_totals(user_ids=None):
+    """ Суммы, посчитанные заново из списков покупок и рецептов. """
+    # Условия в одном filter(), чтобы не было второго соединения.
+    lookups = {'recipe__cart_recipe__isnull': False}
+    if user_ids is not None:
+        lookups['recipe__cart_recipe__user__in'] = user_ids
+    totals = RecipeIngredient.objects.filter(**lookups).values_list(
+        'recipe__cart_recipe__user', 'ingredient'
+    ).annotate(total=Sum('amount')).order_by()
+    return {(user_id, pk): total for user_id, pk, total in totals.iterator()}
+
+
+def find_cart_mismatches():
+    """ Пары (user_id, ingredient_id), где сохраненная сумма
+        отличается от посчитанной заново. """
+    expected = get_expected_totals()
+    stored = {(user_id, pk): total
+              for user_id, pk, total in ShoppingCartIngredient.objects
+              .values_list('user_id', 'ingredient_id', 'total_amount')
+              .iterator()}
+    return sorted(key for key in expected.keys() | stored.keys()
+                  if expected.get(key, 0) != stored.get(key, 0))
+
+
+@transaction.atomic
+def rebuild_cart_totals(user_ids=None):
+    totals = get_expected_totals(user_ids)
+    rows = ShoppingCartIngredient.objects.all()
+    if user_ids is not None:
+        rows = rows.filter(user_id__in=user_ids)
+    rows.delete()
+    ShoppingCartIngredient.objects.bulk_create([
+        ShoppingCartIngredient(user_id=user_id, ingredient_id=pk,
+                               total_amount=total)
+        for (user_id, pk), total in totals.items()
+    ], batch_size=1000)
+    return len(totals)
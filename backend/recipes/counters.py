@@ -0,0 +1,69 @@
+from django.contrib.auth import get_user_model
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import Favorite, Follow, Recipe, ShopList
+
+User = get_user_model()
+
+RECIPE_COUNTERS = {
+    Favorite: 'favorites_count',
+    ShopList: 'carts_count',
+}
+
+
+def change_counter(queryset, field, delta):
+    """ Атомарно меняет счетчик через F(), не опуская его ниже нуля. """
+    if delta < 0:
+        queryset = queryset.filter(**{f'{field}__gte': -delta})
+    return queryset.update(**{field: F(field) + delta})
+
+
+def change_recipe_counter(model, recipe_ids, delta):
+    return change_counter(Recipe.objects.filter(pk__in=recipe_ids),
+                          RECIPE_COUNTERS[model], delta)
+
+
+def change_recipes_count(author_id, delta):
+    return change_counter(User.objects.filter(pk=author_id),
+                          'recipes_count', delta)
+
+
+def change_followers_count(author_id, delta):
+    """ Меняет число подписчиков под блокировкой строки автора,
+        возвращает значения до и после изменения. """
+    old = User.objects.select_for_update().filter(pk=author_id).values_list(
+        'followers_count', flat=True).first()
+    if old is None:
+        return None, None
+    if change_counter(User.objects.filter(pk=author_id),
+                      'followers_count', delta):
+        return old, old + delta
+    return old, old
+
+
+def count_subquery(model, field):
+    return Coalesce(Subquery(
+        model.objects.filter(
+            **{field: OuterRef('pk')}
+        ).order_by().values(field).annotate(
+            total=Count('pk')
+        ).values('total')
+    ), 0)
+
+
+def recount_counters():
+    """ Пересчитывает все счетчики, возвращает число исправленных строк. """
+    fixed = {}
+    targets = [
+        (Recipe, field, count_subquery(model, 'recipe'))
+        for model, field in RECIPE_COUNTERS.items()
+    ] + [(User, 'recipes_count', count_subquery(Recipe, 'author')),
+         (User, 'followers_count', count_subquery(Follow, 'following'))]
+    for model, field, actual in targets:
+        stale = model.objects.annotate(actual=actual).exclude(
+            **{field: F('actual')}).values('pk')
+        fixed[f'{model.__name__}.{field}'] = model.objects.filter(
+            pk__in=list(stale.values_list('pk', flat=True))
+        ).update(**{field: actual})
+    return fixed
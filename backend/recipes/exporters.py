@@ -0,0 +1,216 @@
+import csv
+import datetime
+import io
+import textwrap
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+from rest_framework.renderers import BaseRenderer
+
+DEFAULT_EXPORTERS = [
+    'recipes.exporters.TextExporter',
+    'recipes.exporters.CsvExporter',
+    'recipes.exporters.PdfExporter',
+]
+
+
+def get_exporter_classes():
+    """ Классы выгрузки списка покупок из настройки
+        SHOPPING_LIST_EXPORTERS, первый используется по умолчанию. """
+    paths = getattr(settings, 'SHOPPING_LIST_EXPORTERS', DEFAULT_EXPORTERS)
+    return [import_string(path) for path in paths]
+
+
+class ShoppingListExporter(BaseRenderer):
+    """ Базовый класс выгрузки списка покупок.
+        Выбирается по параметру ?format= или заголовку Accept. """
+
+    filename = 'BuyList'
+
+    @property
+    def content_type(self):
+        if self.charset:
+            return f'{self.media_type}; charset={self.charset}'
+        return self.media_type
+
+    def get_filename(self):
+        return f'{self.filename}.{self.format}'
+
+    def iter_lines(self, items):
+        for item in items:
+            yield (f"* {item['ingredient__name']}:{item['amount']}"
+                   f"{item['ingredient__measurement_unit']}")
+        yield ''
+        yield f' Enjoy your meal, {datetime.date.today().year}'
+
+    def iter_render(self, items):
+        """ Отдает содержимое файла частями в байтах. """
+        raise NotImplementedError
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        # Через render проходят только ответы с ошибками.
+        if data is None:
+            return b''
+        if isinstance(data, dict):
+            data = '\n'.join(f'{key}: {value}' for key, value in data.items())
+        return str(data).encode('utf-8')
+
+
+class TextExporter(ShoppingListExporter):
+    media_type = 'text/plain'
+    format = 'txt'
+
+    def iter_render(self, items):
+        lines = self.iter_lines(items)
+        line = next(lines)
+        for next_line in lines:
+            yield f'{line}\n'.encode(self.charset)
+            line = next_line
+        yield line.encode(self.charset)
+
+
+class CsvExporter(ShoppingListExporter):
+    media_type = 'text/csv'
+    format = 'csv'
+    header = ('Ингредиент', 'Единица измерения', 'Количество')
+
+    def iter_render(self, items):
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        # BOM нужен, чтобы Excel распознал кодировку.
+        buffer.write('\ufeff')
+        writer.writerow(self.header)
+        for item in items:
+            writer.writerow((item['ingredient__name'],
+                             item['ingredient__measurement_unit'],
+                             item['amount']))
+            yield buffer.getvalue().encode(self.charset)
+            buffer.seek(0)
+            buffer.truncate()
+        if buffer.tell():
+            yield buffer.getvalue().encode(self.charset)
+
+
+def get_cyrillic_glyphs():
+    """ Коды windows-1251 и имена глифов кириллицы по Adobe Glyph List. """
+    upper = 'АБВГДЕЖЗИЙКЛМНОПРСТУФХЦЧШЩЪЫЬЭЮЯ'
+    lower = upper.lower()
+    glyphs = {'Ё': (0xA8, 'afii10023'), 'ё': (0xB8, 'afii10071')}
+    for number, letter in enumerate(upper):
+        name = 10017 + number + (number > 5)
+        glyphs[letter] = (0xC0 + number, f'afii{name}')
+    for number, letter in enumerate(lower):
+        name = 10065 + number + (number > 5)
+        glyphs[letter] = (0xE0 + number, f'afii{name}')
+    return glyphs
+
+
+CYRILLIC_GLYPHS = get_cyrillic_glyphs()
+
+
+class PdfExporter(ShoppingListExporter):
+    """ Текстовый PDF со стандартным шрифтом Helvetica: шрифт
+        не встраивается, текст можно искать и копировать. Кириллица
+        кодируется через /Differences, как в windows-1251. """
+
+    media_type = 'application/pdf'
+    format = 'pdf'
+    charset = None
+    render_style = 'binary'
+    page_size = (595, 842)
+    margin = 56
+    font_size = 12
+    line_height = 18
+    line_width = 80
+
+    def get_encoding(self):
+        differences = ' '.join(
+            f'{code} /{name}'
+            for code, name in sorted(CYRILLIC_GLYPHS.values()))
+        return (f'<< /Type /Encoding /BaseEncoding /WinAnsiEncoding '
+                f'/Differences [{differences}] >>')
+
+    def encode(self, text):
+        """ Строка PDF: кириллица по /Differences, остальное
+            по WinAnsiEncoding, неизвестные символы заменяются на ?. """
+        codes = {code for code, _ in CYRILLIC_GLYPHS.values()}
+        result = bytearray()
+        for char in text:
+            if char in CYRILLIC_GLYPHS:
+                result.append(CYRILLIC_GLYPHS[char][0])
+                continue
+            try:
+                code = char.encode('cp1252')[0]
+            except UnicodeEncodeError:
+                code = ord('?')
+            if code in codes:
+                code = ord('?')
+            if code in b'()\\':
+                result.append(ord('\\'))
+            result.append(code)
+        return b'(' + bytes(result) + b')'
+
+    def iter_pages(self, items):
+        lines_per_page = (
+            self.page_size[1] - 2 * self.margin) // self.line_height
+        page = []
+        for line in self.iter_lines(items):
+            for part in textwrap.wrap(line, self.line_width) or ['']:
+                page.append(part)
+                if len(page) == lines_per_page:
+                    yield page
+                    page = []
+        if page:
+            yield page
+
+    def get_content(self, lines):
+        top = self.page_size[1] - self.margin - self.font_size
+        content = [f'BT /F1 {self.font_size} Tf {self.line_height} TL '
+                   f'{self.margin} {top} Td'.encode('ascii')]
+        content.extend(self.encode(line) + b' Tj T*' for line in lines)
+        content.append(b'ET')
+        return b'\n'.join(content)
+
+    def iter_render(self, items):
+        """ Страницы записываются по мере готовности, дерево страниц,
+            каталог и таблица смещений - в конце файла. """
+        offsets = {}
+        position = 0
+
+        def write_object(number, body):
+            nonlocal position
+            offsets[number] = position
+            chunk = b'%d 0 obj\n%s\nendobj\n' % (number, body)
+            position += len(chunk)
+            return chunk
+
+        header = b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n'
+        position = len(header)
+        yield header
+        # 1 - каталог, 2 - дерево страниц, 3 - шрифт.
+        yield write_object(3, (
+            '<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica '
+            f'/Encoding {self.get_encoding()} >>').encode('ascii'))
+        kids = []
+        number = 3
+        width, height = self.page_size
+        for lines in self.iter_pages(items):
+            content = self.get_content(lines)
+            yield write_object(number + 1, b'<< /Length %d >>\nstream\n%s'
+                               b'\nendstream' % (len(content), content))
+            yield write_object(number + 2, (
+                f'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {width} '
+                f'{height}] /Resources << /Font << /F1 3 0 R >> >> '
+                f'/Contents {number + 1} 0 R >>').encode('ascii'))
+            kids.append(f'{number + 2} 0 R')
+            number += 2
+        yield write_object(2, (
+            f'<< /Type /Pages /Kids [{" ".join(kids)}] '
+            f'/Count {len(kids)} >>').encode('ascii'))
+        yield write_object(1, b'<< /Type /Catalog /Pages 2 0 R >>')
+        xref = [b'xref\n0 %d\n0000000000 65535 f \n' % (number + 1)]
+        xref.extend(b'%010d 00000 n \n' % offsets[obj]
+                    for obj in range(1, number + 1))
+        xref.append(b'trailer\n<< /Size %d /Root 1 0 R >>\n'
+                    b'startxref\n%d\n%%%%EOF\n' % (number + 1, position))
+        yield b''.join(xref)
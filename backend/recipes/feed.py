@@ -0,0 +1,148 @@
+from itertools import islice
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import transaction
+
+from .jobs import schedule_job
+from .models import FeedEntry, Follow, Recipe
+
+User = get_user_model()
+
+FEED_CELEBRITIES_KEY = 'feed_celebrities'
+
+
+def bulk_create_entries(entries):
+    """ Создает записи ленты пачками, уже существующие пропускает. """
+    entries = iter(entries)
+    while True:
+        batch = list(islice(entries, settings.FEED_BATCH_SIZE))
+        if not batch:
+            return
+        FeedEntry.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+def is_celebrity(followers_count):
+    return followers_count >= settings.FEED_FANOUT_LIMIT
+
+
+def get_celebrity_ids():
+    """ Авторы, чьи рецепты подмешиваются в ленту при чтении. """
+    ids = cache.get(FEED_CELEBRITIES_KEY)
+    if ids is None:
+        ids = list(User.objects.filter(
+            followers_count__gte=settings.FEED_FANOUT_LIMIT
+        ).values_list('id', flat=True))
+        cache.set(FEED_CELEBRITIES_KEY, ids,
+                  settings.FEED_CELEBRITIES_TIMEOUT)
+    return ids
+
+
+def get_latest_recipe_ids(author_id):
+    return Recipe.objects.filter(author_id=author_id).order_by(
+        '-id').values_list('id', flat=True)[:settings.FEED_BACKFILL_SIZE]
+
+
+def fan_out_recipe(recipe_id):
+    """ Раскладывает новый рецепт по лентам подписчиков автора. """
+    recipe = Recipe.objects.filter(pk=recipe_id).values(
+        'author_id', 'author__followers_count').first()
+    if recipe is None or is_celebrity(recipe['author__followers_count']):
+        return
+    author_id = recipe['author_id']
+    bulk_create_entries(
+        FeedEntry(user_id=user_id, recipe_id=recipe_id, author_id=author_id)
+        for user_id in Follow.objects.filter(
+            following_id=author_id
+        ).values_list('user_id', flat=True).iterator())
+
+
+def backfill_author(author_id):
+    """ Последние рецепты автора в ленты всех его подписчиков. """
+    recipe_ids = list(get_latest_recipe_ids(author_id))
+    bulk_create_entries(
+        FeedEntry(user_id=user_id, recipe_id=recipe_id, author_id=author_id)
+        for user_id in Follow.objects.filter(
+            following_id=author_id
+        ).values_list('user_id', flat=True).iterator()
+        for recipe_id in recipe_ids)
+
+
+def follow_author(user_id, author_id):
+    followers_count = User.objects.filter(pk=author_id).values_list(
+        'followers_count', flat=True).first()
+    if followers_count is None or is_celebrity(followers_count):
+        return
+    bulk_create_entries(
+        FeedEntry(user_id=user_id, recipe_id=recipe_id, author_id=author_id)
+        for recipe_id in get_latest_recipe_ids(author_id))
+
+
+def unfollow_author(user_id, author_id):
+    FeedEntry.objects.filter(user_id=user_id, author_id=author_id).delete()
+
+
+def followers_changed(author_id, old, new):
+    """ Вызывается с числом подписчиков до и после изменения,
+        прочитанным под блокировкой строки автора. """
+    if old is None or is_celebrity(old) == is_celebrity(new):
+        return
+    transaction.on_commit(lambda: cache.delete(FEED_CELEBRITIES_KEY))
+    if is_celebrity(old):
+        # Пока у автора было много подписчиков, его рецепты
+        # не раскладывались по лентам.
+        schedule_job(backfill_author, author_id)
+
+
+def get_feed_ids(user_id, before=None, limit=None):
+    """ id рецептов ленты по убыванию, не больше limit, с id < before.
+        Готовые записи ленты объединяются с рецептами популярных
+        авторов, число запросов не зависит от числа подписок. """
+    entries = FeedEntry.objects.filter(user_id=user_id)
+    if before is not None:
+        entries = entries.filter(recipe_id__lt=before)
+    ids = set(entries.order_by('-recipe_id').values_list(
+        'recipe_id', flat=True)[:limit])
+    celebrity_ids = get_celebrity_ids()
+    if celebrity_ids:
+        recipes = Recipe.objects.filter(author_id__in=Follow.objects.filter(
+            user_id=user_id, following_id__in=celebrity_ids
+        ).values('following_id'))
+        if before is not None:
+            recipes = recipes.filter(id__lt=before)
+        ids.update(recipes.order_by('-id').values_list(
+            'id', flat=True)[:limit])
+    return sorted(ids, reverse=True)[:limit]
+
+
+@transaction.atomic
+def rebuild_feed(user_ids=None):
+    """ Собирает ленты заново по подпискам, возвращает число записей. """
+    entries = FeedEntry.objects.all()
+    follows = Follow.objects.filter(
+        following__followers_count__lt=settings.FEED_FANOUT_LIMIT)
+    if user_ids is not None:
+        entries = entries.filter(user_id__in=user_ids)
+        follows = follows.filter(user_id__in=user_ids)
+    # У записей ленты нет сигналов и счетчиков,
+    # delete() выполняется одним DELETE.
+    entries.delete()
+    author_ids = set(follows.values_list('following_id', flat=True))
+    recipes = {}
+    if author_ids:
+        recipes = Recipe.objects.latest_by_author(
+            author_ids, settings.FEED_BACKFILL_SIZE)
+    created = 0
+
+    def build():
+        nonlocal created
+        for user_id, author_id in follows.values_list(
+                'user_id', 'following_id').iterator():
+            for recipe in recipes.get(author_id, ()):
+                created += 1
+                yield FeedEntry(user_id=user_id, recipe_id=recipe.id,
+                                author_id=author_id)
+
+    bulk_create_entries(build())
+    return created
@@ -1,39 +1,110 @@
+from django.conf import settings
+from django.db.models import Exists, F, OuterRef
 from django_filters import rest_framework as django_filters
 from rest_framework import filters
 
-from recipes.models import Recipe, Tag
+from recipes.cache import get_tag_ids
+from recipes.models import Recipe, RecipeIngredient
+from recipes.search import search_ingredients, search_recipes
 
 
-class IngredientSearchFilter(filters.SearchFilter):
+class IngredientSearchFilter(filters.BaseFilterBackend):
+    """ Поиск ингредиентов для автодополнения: сначала совпадения
+        по началу названия, затем по вхождению. """
 
     search_param = 'name'
 
+    def filter_queryset(self, request, queryset, view):
+        term = request.query_params.get(self.search_param, '').strip()
+        if not term or getattr(view, 'action', None) != 'list':
+            return queryset
+        return search_ingredients(
+            queryset, term, settings.INGREDIENT_SEARCH_LIMIT)
+
+
+class NumberInFilter(django_filters.BaseInFilter,
+                     django_filters.NumberFilter):
+    pass
+
 
 class RecipeFilter(django_filters.FilterSet):
-    tags = django_filters.ModelMultipleChoiceFilter(
-        field_name='tags__slug',
-        queryset=Tag.objects.all(),
-        to_field_name='slug',
-    )
+    tags = django_filters.CharFilter(method='get_tags')
+    tags_all = django_filters.BooleanFilter(method='get_tags_all')
     is_favorited = django_filters.BooleanFilter(
         method='get_is_favorited'
     )
     is_in_shopping_cart = django_filters.BooleanFilter(
         method='get_is_in_shopping_cart'
     )
+    ordering = django_filters.ChoiceFilter(
+        choices=(('new', 'Новые'), ('popular', 'Популярные')),
+        method='get_ordering'
+    )
+    search = django_filters.CharFilter(method='get_search')
+    ingredients = NumberInFilter(method='get_ingredients')
+    exclude_ingredients = NumberInFilter(method='get_exclude_ingredients')
 
     class Meta:
         model = Recipe
-        fields = ('tags', 'author', 'is_favorited', 'is_in_shopping_cart')
+        fields = ('tags', 'tags_all', 'author', 'is_favorited', 'is_in_shopping_cart',
+                  'ordering', 'search', 'ingredients', 'exclude_ingredients')
+
+    def get_tags(self, queryset, name, value):
+        """ Рецепты с любым из тегов ?tags=, с ?tags_all=true
+            рецепты со всеми тегами. Повторов рецептов нет,
+            так как соединения с тегами не делается. """
+        slugs = set(self.data.getlist(name))
+        tag_ids = get_tag_ids()
+        ids = {tag_ids[slug] for slug in slugs if slug in tag_ids}
+        through = Recipe.tags.through.objects.filter(recipe=OuterRef('pk'))
+        if self.form.cleaned_data.get('tags_all'):
+            if len(ids) < len(slugs):
+                return queryset.none()
+            for tag_id in ids:
+                queryset = queryset.filter(
+                    Exists(through.filter(tag_id=tag_id)))
+            return queryset
+        if not ids:
+            return queryset.none()
+        return queryset.filter(Exists(through.filter(tag_id__in=ids)))
+
+    def get_tags_all(self, queryset, name, value):
+        # Учитывается в get_tags.
+        return queryset
 
     def get_is_favorited(self, queryset, name, value):
-        user = self.request.user
         if value:
-            return queryset.filter(favorite_recipe__user=user)
+            return queryset.filter(is_favorited=True)
         return queryset
 
     def get_is_in_shopping_cart(self, queryset, name, value):
-        user = self.request.user
         if value:
-            return queryset.filter(cart_recipe__user=user)
+            return queryset.filter(is_in_shopping_cart=True)
+        return queryset
+
+    def get_ordering(self, queryset, name, value):
+        if value == 'popular':
+            return queryset.order_by(
+                F('popularity__score').desc(nulls_last=True), '-id')
+        return queryset
+
+    def get_search(self, queryset, name, value):
+        value = value.strip()
+        if value:
+            return search_recipes(queryset, value)
+        return queryset
+
+    def has_ingredient(self, ingredient_id):
+        return Exists(RecipeIngredient.objects.filter(
+            recipe=OuterRef('pk'), ingredient_id=ingredient_id))
+
+    def get_ingredients(self, queryset, name, value):
+        """ Рецепты, в которых есть все перечисленные ингредиенты. """
+        for ingredient_id in set(value):
+            queryset = queryset.filter(self.has_ingredient(ingredient_id))
+        return queryset
+
+    def get_exclude_ingredients(self, queryset, name, value):
+        for ingredient_id in set(value):
+            queryset = queryset.filter(~self.has_ingredient(ingredient_id))
         return queryset
@@ -0,0 +1,142 @@
+import io
+import logging
+import threading
+from datetime import timedelta
+from pathlib import PurePosixPath
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+from .cache import invalidate_recipe_feed
+from .jobs import run_job, schedule_job
+from .models import PendingFileDeletion, Recipe
+
+logger = logging.getLogger(__name__)
+
+EXTENSIONS = {
+    'JPEG': 'jpg',
+    'WEBP': 'webp',
+    'PNG': 'png',
+}
+
+
+def get_extension():
+    return EXTENSIONS[settings.RECIPE_IMAGE_FORMAT]
+
+
+def thumbnail_name(name, size):
+    """ name - имя уже обработанного изображения. Миниатюры лежат
+        по его полному пути: имена уникальны только вместе с каталогом. """
+    return f'thumbnails/{size}/{name}'
+
+
+def get_thumbnail_names(name):
+    return [thumbnail_name(name, size)
+            for size in settings.RECIPE_THUMBNAIL_SIZES]
+
+
+def get_thumbnail_urls(recipe):
+    """ Адреса миниатюр рецепта или None, пока они не готовы. """
+    return get_thumbnail_urls_by_name(recipe.image.name,
+                                      recipe.image_processed)
+
+
+def get_thumbnail_urls_by_name(name, processed):
+    if not processed or not name:
+        return None
+    return {
+        size: default_storage.url(thumbnail_name(name, size))
+        for size in settings.RECIPE_THUMBNAIL_SIZES
+    }
+
+
+def encode(image):
+    buffer = io.BytesIO()
+    image.save(buffer, settings.RECIPE_IMAGE_FORMAT,
+               quality=settings.RECIPE_IMAGE_QUALITY, optimize=True)
+    return ContentFile(buffer.getvalue())
+
+
+def replace_file(name, content):
+    if default_storage.exists(name):
+        default_storage.delete(name)
+    return default_storage.save(name, content)
+
+
+def process_recipe_image(recipe_id):
+    """ Уменьшает изображение рецепта, перекодирует его
+        и создает миниатюры из RECIPE_THUMBNAIL_SIZES. """
+    recipe = Recipe.objects.filter(pk=recipe_id).only(
+        'image', 'image_processed').first()
+    if recipe is None or not recipe.image:
+        return
+    name = recipe.image.name
+    with default_storage.open(name) as file:
+        image = Image.open(file)
+        image = ImageOps.exif_transpose(image).convert('RGB')
+    max_size = settings.RECIPE_IMAGE_MAX_SIZE
+    image.thumbnail((max_size, max_size))
+    # Хранилище не перезаписывает существующий файл, а выбирает
+    # свободное имя: x.png и x.jpg разных рецептов не пересекутся.
+    new_name = default_storage.save(
+        str(PurePosixPath(name).with_suffix(f'.{get_extension()}')),
+        encode(image))
+    for size, dimensions in settings.RECIPE_THUMBNAIL_SIZES.items():
+        replace_file(thumbnail_name(new_name, size),
+                     encode(ImageOps.fit(image, dimensions)))
+    updated = Recipe.objects.filter(pk=recipe_id, image=name).update(
+        image=new_name, image_processed=True)
+    if not updated:
+        # Изображение сменилось во время обработки, результат не нужен.
+        for new_file in [new_name, *get_thumbnail_names(new_name)]:
+            delete_file(new_file)
+        return
+    # update() не отправляет сигналы, лента сбрасывается явно.
+    invalidate_recipe_feed()
+    old_files = [name]
+    if recipe.image_processed:
+        old_files.extend(get_thumbnail_names(name))
+    schedule_file_deletion(*old_files)
+
+
+def delete_file(name):
+    try:
+        default_storage.delete(name)
+    except Exception:
+        logger.exception('Failed to delete image %s', name)
+
+
+def schedule_file_deletion(*names):
+    """ Удаляет старые файлы не сразу: их адреса уже могли уйти
+        в ответе на создание рецепта или в кэш. Удаление записывается
+        в базу, таймер лишь запускает его вовремя. Если процесс
+        завершится раньше, файлы удалит process_images. """
+    delete_after = timezone.now() + timedelta(
+        seconds=settings.RECIPE_IMAGE_DELETE_DELAY)
+    PendingFileDeletion.objects.bulk_create([
+        PendingFileDeletion(name=name, delete_after=delete_after)
+        for name in names])
+    timer = threading.Timer(settings.RECIPE_IMAGE_DELETE_DELAY,
+                            run_job, [delete_pending_files])
+    timer.daemon = True
+    timer.start()
+    return timer
+
+
+def delete_pending_files():
+    """ Удаляет файлы, срок которых наступил, возвращает их число. """
+    pending = list(PendingFileDeletion.objects.filter(
+        delete_after__lte=timezone.now()).values_list('pk', 'name'))
+    for _, name in pending:
+        delete_file(name)
+    PendingFileDeletion.objects.filter(
+        pk__in=[pk for pk, _ in pending]).delete()
+    return len(pending)
+
+
+def schedule_image_processing(recipe):
+    """ Ставит обработку изображения в фоновую очередь после коммита. """
+    schedule_job(process_recipe_image, recipe.pk)
@@ -0,0 +1,42 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.BACKGROUND_JOBS_WORKERS,
+            thread_name_prefix='recipe-jobs')
+    return _executor
+
+
+def run_job(func, *args):
+    try:
+        func(*args)
+    except Exception:
+        logger.exception('Background job %s%r failed', func.__name__, args)
+    finally:
+        close_old_connections()
+
+
+def schedule_job(func, *args):
+    """ Запускает func(*args) в фоновом потоке после коммита,
+        чтобы не задерживать ответ на запрос. Задачи не переживают
+        перезапуск процесса, поэтому их результат должен
+        восстанавливаться командой (rebuild_feed, process_images).
+        С BACKGROUND_JOBS_ASYNC=False задача выполняется сразу
+        после коммита в текущем потоке. """
+    def submit():
+        if settings.BACKGROUND_JOBS_ASYNC:
+            get_executor().submit(run_job, func, *args)
+        else:
+            func(*args)
+    transaction.on_commit(submit)
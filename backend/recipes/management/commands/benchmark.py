@@ -0,0 +1,177 @@
+import base64
+import io
+import json
+import time
+import tracemalloc
+from contextlib import ExitStack
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.test import Client
+from django.utils import timezone
+from PIL import Image
+from rest_framework.authtoken.models import Token
+
+from config.middleware import QueryRecorder
+from recipes.models import Follow, Ingredient, Recipe, ShopList, Tag
+
+SCENARIOS = ('recipes', 'recipes_anonymous', 'subscriptions', 'feed',
+             'ingredients', 'shopping_cart', 'recipe_create')
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+
+def get_image():
+    buffer = io.BytesIO()
+    Image.new('RGB', (640, 480), (60, 120, 200)).save(buffer, 'PNG')
+    return ('data:image/png;base64,'
+            + base64.b64encode(buffer.getvalue()).decode())
+
+
+class Command(BaseCommand):
+    help = 'Measures latency, queries and memory of the API hot paths'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=50)
+        parser.add_argument('--warmup', type=int, default=5)
+        parser.add_argument('--scenario', action='append',
+                            choices=SCENARIOS,
+                            help='Scenario to run, all by default')
+        parser.add_argument('--user',
+                            help='Email of the user to run requests as')
+        parser.add_argument('--cold', action='store_true',
+                            help='Clear the cache before every request')
+        parser.add_argument('--json', dest='output',
+                            help='Path to save results as JSON')
+
+    def get_user(self, email):
+        follows = Follow.objects.order_by('id')
+        if email:
+            follows = follows.filter(user__email=email)
+        follow = (follows.filter(user__cart_recipe__isnull=False).first()
+                  or follows.first())
+        if follow is None:
+            raise CommandError(
+                'No user with subscriptions, run generate_data first')
+        return follow.user_id
+
+    def get_requests(self):
+        """ Запросы сценариев: метод, путь, тело. """
+        ingredient = Ingredient.objects.order_by('id').first()
+        term = ingredient.name[:2] if ingredient else 'a'
+        tags = list(Tag.objects.values_list('id', flat=True)[:2])
+        ingredients = list(
+            Ingredient.objects.values_list('id', flat=True)[:8])
+        return {
+            'recipes': ('get', '/api/recipes/?limit=6', None),
+            'recipes_anonymous': ('get', '/api/recipes/?limit=6', None),
+            'subscriptions': (
+                'get', '/api/users/subscriptions/?recipes_limit=3', None),
+            'feed': ('get', '/api/recipes/feed/?limit=6', None),
+            'ingredients': ('get', f'/api/ingredients/?name={term}', None),
+            'shopping_cart': (
+                'get', '/api/recipes/download_shopping_cart/?format=txt',
+                None),
+            'recipe_create': ('post', '/api/recipes/', {
+                'name': 'Benchmark', 'text': 'Benchmark recipe',
+                'cooking_time': 10, 'image': get_image(), 'tags': tags,
+                'ingredients': [{'id': pk, 'amount': 10}
+                                for pk in ingredients]}),
+        }
+
+    def request(self, client, method, path, data):
+        if data is None:
+            response = getattr(client, method)(path)
+        else:
+            response = getattr(client, method)(
+                path, json.dumps(data), content_type='application/json')
+        if response.status_code >= 400:
+            raise CommandError(
+                f'{method.upper()} {path}: {response.status_code}')
+        if response.streaming:
+            b''.join(response.streaming_content)
+        return response
+
+    def measure(self, client, method, path, data, cold):
+        recorder = QueryRecorder()
+        if cold:
+            cache.clear()
+        with ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(
+                    connections[alias].execute_wrapper(recorder))
+            start = time.perf_counter()
+            self.request(client, method, path, data)
+            duration = time.perf_counter() - start
+        return duration, recorder.count
+
+    def run_scenario(self, client, request, options):
+        for _ in range(options['warmup']):
+            self.request(client, *request)
+        durations, queries = [], []
+        for _ in range(options['iterations']):
+            duration, count = self.measure(
+                client, *request, options['cold'])
+            durations.append(duration * 1000)
+            queries.append(count)
+        # Память меряется отдельным запросом, tracemalloc замедляет код.
+        tracemalloc.start()
+        self.request(client, *request)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        return {
+            'p50_ms': round(percentile(durations, 0.5), 2),
+            'p95_ms': round(percentile(durations, 0.95), 2),
+            'mean_ms': round(sum(durations) / len(durations), 2),
+            'queries': max(queries),
+            'peak_memory_kb': round(peak / 1024, 1),
+        }
+
+    def handle(self, *args, **options):
+        if options['iterations'] < 1:
+            raise CommandError('--iterations must be positive')
+        user_id = self.get_user(options['user'])
+        token, _ = Token.objects.get_or_create(user_id=user_id)
+        client = Client(HTTP_AUTHORIZATION=f'Token {token.key}')
+        anonymous = Client()
+        requests = self.get_requests()
+        latest = Recipe.objects.order_by('-id').values_list(
+            'id', flat=True).first() or 0
+        results = {}
+        try:
+            for name in options['scenario'] or SCENARIOS:
+                results[name] = self.run_scenario(
+                    anonymous if name == 'recipes_anonymous' else client,
+                    requests[name], options)
+                self.stdout.write(
+                    f'{name:20} ' + '  '.join(
+                        f'{key}={value}'
+                        for key, value in results[name].items()))
+        finally:
+            # Рецепты, созданные сценарием recipe_create.
+            for pk in Recipe.objects.filter(
+                    pk__gt=latest, author_id=user_id, name='Benchmark'
+            ).values_list('id', flat=True):
+                client.delete(f'/api/recipes/{pk}/')
+        report = {
+            'created': timezone.now().isoformat(),
+            'database': connection.vendor,
+            'iterations': options['iterations'],
+            'cold_cache': options['cold'],
+            'dataset': {
+                'recipes': Recipe.objects.count(),
+                'ingredients': Ingredient.objects.count(),
+                'follows': Follow.objects.count(),
+                'carts': ShopList.objects.count(),
+            },
+            'results': results,
+        }
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                json.dump(report, file, indent=2, ensure_ascii=False)
+            self.stdout.write(self.style.SUCCESS(
+                f'Results saved to {options["output"]}'))
@@ -0,0 +1,166 @@
+import io
+import random
+import time
+
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from PIL import Image
+from recipes.cache import invalidate_recipe_feed, invalidate_reference
+from recipes.cart import rebuild_cart_totals
+from recipes.counters import recount_counters
+from recipes.feed import rebuild_feed
+from recipes.models import (Favorite, Follow, Ingredient, Recipe,
+                            RecipeIngredient, ShopList, Tag)
+from recipes.search import rebuild_search_index
+from users.models import CustomUser
+
+IMAGE_NAME = 'bench/recipe.jpg'
+PASSWORD = 'bench-password'
+TAGS = (
+    ('Завтрак', '#E26C2D', 'breakfast'),
+    ('Обед', '#49B64E', 'lunch'),
+    ('Ужин', '#8775D2', 'dinner'),
+)
+WORDS = ('суп', 'салат', 'пирог', 'каша', 'рагу', 'запеканка', 'паста',
+         'омлет', 'курица', 'рыба', 'овощи', 'грибы', 'сыр', 'томат')
+
+
+def get_image():
+    if not default_storage.exists(IMAGE_NAME):
+        buffer = io.BytesIO()
+        Image.new('RGB', (640, 480), (200, 120, 60)).save(buffer, 'JPEG')
+        default_storage.save(IMAGE_NAME, ContentFile(buffer.getvalue()))
+    return IMAGE_NAME
+
+
+class Command(BaseCommand):
+    help = 'Generates a synthetic dataset for benchmarks'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100)
+        parser.add_argument('--recipes', type=int, default=10,
+                            help='Recipes per user')
+        parser.add_argument('--ingredients', type=int, default=8,
+                            help='Ingredients per recipe')
+        parser.add_argument('--follows', type=int, default=10,
+                            help='Subscriptions per user')
+        parser.add_argument('--favorites', type=int, default=20,
+                            help='Favorite recipes per user')
+        parser.add_argument('--carts', type=int, default=5,
+                            help='Shopping cart recipes per user')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def bulk_create(self, model, objects):
+        model.objects.bulk_create(objects, batch_size=self.batch_size)
+        return len(objects)
+
+    def create_users(self, count):
+        offset = CustomUser.objects.count()
+        password = make_password(PASSWORD)
+        names = [f'bench{offset + number}' for number in range(count)]
+        self.bulk_create(CustomUser, [
+            CustomUser(username=name, email=f'{name}@example.com',
+                       first_name='Bench', last_name=name,
+                       password=password)
+            for name in names])
+        return list(CustomUser.objects.filter(
+            username__in=names).values_list('id', flat=True))
+
+    def get_ingredients(self, count):
+        ingredients = list(Ingredient.objects.values_list('id', flat=True))
+        if len(ingredients) < count:
+            offset = len(ingredients)
+            self.bulk_create(Ingredient, [
+                Ingredient(name=f'ингредиент {offset + number}',
+                           measurement_unit='г')
+                for number in range(count - offset)])
+            ingredients = list(
+                Ingredient.objects.values_list('id', flat=True))
+        return ingredients
+
+    def get_tags(self):
+        for name, color, slug in TAGS:
+            if not Tag.objects.filter(slug=slug).exists():
+                Tag.objects.create(name=name, color=color, slug=slug)
+        return list(Tag.objects.values_list('id', flat=True))
+
+    def create_recipes(self, user_ids, per_user):
+        image = get_image()
+        self.bulk_create(Recipe, [
+            Recipe(author_id=user_id, image=image,
+                   name=' '.join(self.random.sample(WORDS, 2)).capitalize(),
+                   text=' '.join(self.random.choices(WORDS, k=30)),
+                   cooking_time=self.random.randint(5, 180))
+            for user_id in user_ids for _ in range(per_user)])
+        return list(Recipe.objects.filter(
+            author_id__in=user_ids).values_list('id', flat=True))
+
+    def sample(self, population, count):
+        return self.random.sample(population, min(count, len(population)))
+
+    def create_links(self, model, user_ids, recipe_ids, per_user):
+        return self.bulk_create(model, [
+            model(user_id=user_id, recipe_id=recipe_id)
+            for user_id in user_ids
+            for recipe_id in self.sample(recipe_ids, per_user)])
+
+    def create_follows(self, user_ids, per_user):
+        follows = []
+        for user_id in user_ids:
+            following = [pk for pk in self.sample(user_ids, per_user + 1)
+                         if pk != user_id][:per_user]
+            follows.extend(Follow(user_id=user_id, following_id=pk)
+                           for pk in following)
+        return self.bulk_create(Follow, follows)
+
+    def handle(self, *args, **options):
+        self.random = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        start = time.monotonic()
+        with transaction.atomic():
+            user_ids = self.create_users(options['users'])
+            tag_ids = self.get_tags()
+            ingredient_ids = self.get_ingredients(
+                max(options['ingredients'] * 10, 100))
+            recipe_ids = self.create_recipes(user_ids, options['recipes'])
+            created = {
+                'users': len(user_ids),
+                'recipes': len(recipe_ids),
+                'recipe tags': self.bulk_create(Recipe.tags.through, [
+                    Recipe.tags.through(recipe_id=recipe_id, tag_id=tag_id)
+                    for recipe_id in recipe_ids
+                    for tag_id in self.sample(tag_ids, 2)]),
+                'recipe ingredients': self.bulk_create(RecipeIngredient, [
+                    RecipeIngredient(recipe_id=recipe_id,
+                                     ingredient_id=ingredient_id,
+                                     amount=self.random.randint(1, 500))
+                    for recipe_id in recipe_ids
+                    for ingredient_id in self.sample(
+                        ingredient_ids, options['ingredients'])]),
+                'follows': self.create_follows(
+                    user_ids, options['follows']),
+                'favorites': self.create_links(
+                    Favorite, user_ids, recipe_ids, options['favorites']),
+                'carts': self.create_links(
+                    ShopList, user_ids, recipe_ids, options['carts']),
+            }
+            # bulk_create не отправляет сигналы, поэтому счетчики, суммы
+            # списков покупок, ленты, поисковый индекс и кэши
+            # обновляются явно.
+            recount_counters()
+            rebuild_cart_totals(user_ids)
+            rebuild_feed(user_ids)
+            rebuild_search_index()
+            transaction.on_commit(invalidate_recipe_feed)
+            transaction.on_commit(lambda: invalidate_reference('tags'))
+            transaction.on_commit(
+                lambda: invalidate_reference('ingredients'))
+        for name, count in created.items():
+            self.stdout.write(f'{name}: {count}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Generated in {time.monotonic() - start:.1f}s, '
+            f'password for users: {PASSWORD}'))
@@ -1,18 +1,79 @@
 import csv
+import json
+import time
+from pathlib import Path
 
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from recipes.cache import invalidate_reference
 from recipes.models import Ingredient
 
+DEFAULT_PATH = Path(__file__).resolve().parents[2] / 'data' / 'ingredients.csv'
+
+
+def read_csv(file):
+    for row in csv.reader(file):
+        if row:
+            yield row
+
+
+def read_json(file):
+    for item in json.load(file):
+        yield item['name'], item['measurement_unit']
+
+
+READERS = {
+    '.csv': read_csv,
+    '.json': read_json,
+}
+
 
 class Command(BaseCommand):
-    help = 'Loads ingredients from a csv file'
+    help = 'Loads ingredients from a csv or json file'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', nargs='?', default=str(DEFAULT_PATH),
+            help='Path to ingredients.csv or ingredients.json')
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Number of rows inserted per query')
 
     def handle(self, *args, **options):
-        with open('recipes/data/ingredients.csv', encoding='utf-8') as f:
-            reader = csv.reader(f)
-            for row in reader:
-                name, unit = row
-                Ingredient.objects.get_or_create(
-                    name=name, measurement_unit=unit)
-        self.stdout.write(
-            self.style.SUCCESS('Successfully loaded ingredients'))
+        path = Path(options['path'])
+        batch_size = options['batch_size']
+        reader = READERS.get(path.suffix.lower())
+        if reader is None:
+            raise CommandError(f'Unsupported file type: {path.suffix}')
+        if not path.exists():
+            raise CommandError(f'File not found: {path}')
+
+        start = time.monotonic()
+        total = 0
+        with transaction.atomic(), open(path, encoding='utf-8') as file:
+            # bulk_create с ignore_conflicts не сообщает, сколько строк
+            # вставлено, поэтому новые строки считаются по разнице.
+            before = Ingredient.objects.count()
+            seen = set(Ingredient.objects.values_list(
+                'name', 'measurement_unit'))
+            batch = []
+            for name, unit in reader(file):
+                total += 1
+                key = (name.strip(), unit.strip())
+                if key in seen:
+                    continue
+                seen.add(key)
+                batch.append(Ingredient(name=key[0], measurement_unit=key[1]))
+                if len(batch) >= batch_size:
+                    self.insert(batch)
+                    batch = []
+            self.insert(batch)
+            created = Ingredient.objects.count() - before
+        invalidate_reference('ingredients')
+        elapsed = time.monotonic() - start
+        self.stdout.write(self.style.SUCCESS(
+            f'Successfully loaded ingredients: {created} new of {total} rows '
+            f'in {elapsed:.2f}s ({total / max(elapsed, 1e-6):.0f} rows/sec)'))
+
+    def insert(self, batch):
+        Ingredient.objects.bulk_create(batch, ignore_conflicts=True)
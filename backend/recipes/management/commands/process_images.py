@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+from recipes.images import delete_pending_files, process_recipe_image
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = ('Resizes recipe images, generates thumbnails and deletes '
+            'replaced originals whose delay has passed')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all', action='store_true',
+            help='Reprocess images that already have thumbnails')
+
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.exclude(image='')
+        if not options['all']:
+            recipes = recipes.filter(image_processed=False)
+        count = 0
+        for recipe_id in recipes.values_list('id', flat=True).iterator():
+            process_recipe_image(recipe_id)
+            count += 1
+        deleted = delete_pending_files()
+        self.stdout.write(self.style.SUCCESS(
+            f'Successfully processed {count} images, '
+            f'deleted {deleted} old files'))
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand, CommandError
+from recipes.cart import find_cart_mismatches, rebuild_cart_totals
+
+
+class Command(BaseCommand):
+    help = 'Checks or rebuilds shopping cart ingredient totals'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check', action='store_true',
+            help='Only report mismatches, exit with an error if any')
+
+    def handle(self, *args, **options):
+        mismatches = find_cart_mismatches()
+        if options['check']:
+            for user_id, ingredient_id in mismatches[:20]:
+                self.stdout.write(
+                    f'user {user_id}, ingredient {ingredient_id}')
+            if mismatches:
+                raise CommandError(
+                    f'{len(mismatches)} cart totals are out of date')
+            self.stdout.write(self.style.SUCCESS('Cart totals are valid'))
+            return
+        rows = rebuild_cart_totals()
+        self.stdout.write(self.style.SUCCESS(
+            f'Successfully rebuilt {rows} rows, '
+            f'{len(mismatches)} were out of date'))
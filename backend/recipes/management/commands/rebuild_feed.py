@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+from recipes.feed import rebuild_feed
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds subscription feed timelines from follows'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, action='append',
+                            dest='users', help='Rebuild only this user id')
+
+    def handle(self, *args, **options):
+        entries = rebuild_feed(options['users'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Successfully rebuilt feed, {entries} entries'))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+from recipes.search import rebuild_search_index
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds full-text search documents of all recipes'
+
+    def handle(self, *args, **options):
+        documents = rebuild_search_index()
+        self.stdout.write(self.style.SUCCESS(
+            f'Successfully indexed {documents} recipes'))
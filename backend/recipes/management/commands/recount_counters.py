@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from recipes.counters import recount_counters
+
+
+class Command(BaseCommand):
+    help = 'Recomputes favorites, carts and recipes counters'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            fixed = recount_counters()
+        for counter, rows in fixed.items():
+            self.stdout.write(f'{counter}: {rows} rows fixed')
+        self.stdout.write(self.style.SUCCESS('Successfully recounted'))
@@ -0,0 +1,22 @@
+import time
+
+from django.core.management.base import BaseCommand
+from recipes.popularity import refresh_popularity
+
+
+class Command(BaseCommand):
+    help = 'Refreshes precomputed recipe popularity scores'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--loop', type=int, default=0, metavar='SECONDS',
+            help='Keep running and refresh every SECONDS seconds')
+
+    def handle(self, *args, **options):
+        while True:
+            updated = refresh_popularity()
+            self.stdout.write(self.style.SUCCESS(
+                f'Successfully refreshed popularity of {updated} recipes'))
+            if not options['loop']:
+                break
+            time.sleep(options['loop'])
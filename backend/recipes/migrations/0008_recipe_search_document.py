@@ -0,0 +1,67 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+CREATE_VECTOR = [
+    "ALTER TABLE recipes_recipesearchdocument ADD COLUMN vector tsvector "
+    "GENERATED ALWAYS AS ("
+    "setweight(to_tsvector('russian', title), 'A') || "
+    "setweight(to_tsvector('russian', body), 'B')) STORED",
+    'CREATE INDEX recipes_recipesearchdocument_vector_idx '
+    'ON recipes_recipesearchdocument USING gin (vector)',
+]
+
+DROP_VECTOR = [
+    'DROP INDEX IF EXISTS recipes_recipesearchdocument_vector_idx',
+    'ALTER TABLE recipes_recipesearchdocument DROP COLUMN IF EXISTS vector',
+]
+
+
+def run_postgresql(statements):
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor != 'postgresql':
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+    return run
+
+
+def fill_documents(apps, schema_editor):
+    Recipe = apps.get_model('recipes', 'Recipe')
+    RecipeIngredient = apps.get_model('recipes', 'RecipeIngredient')
+    RecipeSearchDocument = apps.get_model('recipes', 'RecipeSearchDocument')
+    ingredients = {}
+    for recipe_id, name in RecipeIngredient.objects.values_list(
+            'recipe_id', 'ingredient__name').iterator():
+        ingredients.setdefault(recipe_id, []).append(name)
+    RecipeSearchDocument.objects.bulk_create([
+        RecipeSearchDocument(
+            recipe_id=recipe_id, title=name,
+            body='\n'.join([text, *ingredients.get(recipe_id, [])]))
+        for recipe_id, name, text in Recipe.objects.values_list(
+            'id', 'name', 'text').iterator()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0007_recipe_popularity'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecipeSearchDocument',
+            fields=[
+                ('recipe', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='search_document', serialize=False, to='recipes.recipe')),
+                ('title', models.TextField(verbose_name='Название')),
+                ('body', models.TextField(verbose_name='Описание и ингредиенты')),
+            ],
+            options={
+                'verbose_name': 'Поисковый документ',
+                'verbose_name_plural': 'Поисковые документы',
+            },
+        ),
+        migrations.RunPython(fill_documents, migrations.RunPython.noop),
+        migrations.RunPython(
+            run_postgresql(CREATE_VECTOR), run_postgresql(DROP_VECTOR)),
+    ]
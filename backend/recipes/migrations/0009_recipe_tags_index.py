@@ -0,0 +1,18 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    """ Индекс (tag_id, recipe_id) для фильтра по тегам через EXISTS,
+        уникальный индекс таблицы начинается с recipe_id. """
+
+    dependencies = [
+        ('recipes', '0008_recipe_search_document'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            'CREATE INDEX IF NOT EXISTS recipes_recipe_tags_tag_recipe_idx '
+            'ON recipes_recipe_tags (tag_id, recipe_id)',
+            'DROP INDEX IF EXISTS recipes_recipe_tags_tag_recipe_idx',
+        ),
+    ]
@@ -0,0 +1,65 @@
+# Generated by Django 3.2.13 on 2026-10-18 17:57
+
+from itertools import islice
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def fill_feed(apps, schema_editor):
+    Recipe = apps.get_model('recipes', 'Recipe')
+    Follow = apps.get_model('recipes', 'Follow')
+    FeedEntry = apps.get_model('recipes', 'FeedEntry')
+    recipes = {}
+    for author_id, recipe_id in Recipe.objects.filter(
+        author__followers_count__lt=settings.FEED_FANOUT_LIMIT
+    ).order_by('author_id', '-id').values_list('author_id', 'id').iterator():
+        ids = recipes.setdefault(author_id, [])
+        if len(ids) < settings.FEED_BACKFILL_SIZE:
+            ids.append(recipe_id)
+    entries = (
+        FeedEntry(user_id=user_id, recipe_id=recipe_id, author_id=author_id)
+        for user_id, author_id in Follow.objects.values_list(
+            'user_id', 'following_id').iterator()
+        for recipe_id in recipes.get(author_id, ())
+    )
+    while True:
+        batch = list(islice(entries, 1000))
+        if not batch:
+            break
+        FeedEntry.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('recipes', '0010_shopping_cart_ingredient'),
+        ('users', '0003_followers_count'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FeedEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('author', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Автор рецепта')),
+                ('recipe', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='feed_entries', to='recipes.recipe')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='feed_entries', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Запись ленты',
+                'verbose_name_plural': 'Записи ленты',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='feedentry',
+            index=models.Index(fields=['user', 'author'], name='feed_entry_user_author_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='feedentry',
+            constraint=models.UniqueConstraint(fields=('user', 'recipe'), name='unique_feed_entry'),
+        ),
+        migrations.RunPython(fill_feed, migrations.RunPython.noop),
+    ]
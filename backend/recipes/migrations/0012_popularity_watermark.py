@@ -0,0 +1,25 @@
+# Generated by Django 3.2.13 on 2026-10-18 18:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0011_feed_entry'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PopularityWatermark',
+            fields=[
+                ('event', models.CharField(max_length=50, primary_key=True, serialize=False, verbose_name='Событие')),
+                ('refreshed_at', models.DateTimeField(verbose_name='Дата пересчета')),
+                ('recent_ids', models.JSONField(default=list, verbose_name='Учтенные события')),
+            ],
+            options={
+                'verbose_name': 'Отметка пересчета популярности',
+                'verbose_name_plural': 'Отметки пересчета популярности',
+            },
+        ),
+    ]
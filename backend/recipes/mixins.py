@@ -0,0 +1,180 @@
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.urls import reverse
+from django.utils.cache import (get_conditional_response,
+                                patch_vary_headers)
+from django.utils.http import http_date, quote_etag
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.response import Response
+
+from config.db.routers import (is_pinned_to_primary, pin_to_primary,
+                               read_from_primary, use_replica)
+
+from .cache import (get_recipe_feed_key, get_recipe_overlay_key,
+                    get_reference_key, get_reference_version)
+from .models import Favorite, Follow, ShopList
+
+
+class ReferenceCacheMixin:
+    """ Кэширование справочников, которые меняются только через админку.
+        Ответы хранятся в кэше до изменения справочника и отдаются
+        с ETag и Last-Modified, повторный запрос получает 304.
+        ETag зависит от формата ответа, в кэше хранятся данные
+        до рендеринга. """
+
+    cache_name = None
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(
+            super().retrieve, request, *args, **kwargs)
+
+    def cached_response(self, handler, request, *args, **kwargs):
+        version, modified = get_reference_version(self.cache_name)
+        key = get_reference_key(
+            self.cache_name, version, request.get_full_path())
+        etag = quote_etag('{}{}-{}'.format(
+            key.rsplit(':', 1)[-1], version[:8],
+            request.accepted_renderer.format))
+        response = get_conditional_response(
+            request, etag=etag, last_modified=modified)
+        if response is None:
+            data = cache.get(key)
+            if data is None:
+                with read_from_primary():
+                    response = handler(request, *args, **kwargs)
+                if response.status_code == 200:
+                    cache.set(key, response.data,
+                              settings.REFERENCE_CACHE_TIMEOUT)
+            else:
+                response = Response(data)
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(modified)
+        patch_vary_headers(response, ['Accept'])
+        return response
+
+    @classmethod
+    def warm_up_cache(cls):
+        version, _ = get_reference_version(cls.cache_name)
+        key = get_reference_key(
+            cls.cache_name, version, reverse(f'{cls.cache_name}-list'))
+        data = cls.serializer_class(cls.queryset.all(), many=True).data
+        cache.set(key, data, settings.REFERENCE_CACHE_TIMEOUT)
+
+
+class RecipeFeedCacheMixin:
+    """ Кэширование ленты рецептов. Общая часть ответа (рецепты, авторы,
+        теги, ингредиенты) строится как для анонимного пользователя
+        и хранится одна на всех, а флаги текущего пользователя
+        накладываются поверх нее при каждом запросе. """
+
+    user_filters = ('is_favorited', 'is_in_shopping_cart')
+    shared_rendering = False
+
+    def get_flags_user(self):
+        if self.shared_rendering:
+            return AnonymousUser()
+        return self.request.user
+
+    def is_feed_cacheable(self, request):
+        if not settings.RECIPE_FEED_CACHE:
+            return False
+        # Значения фильтров берутся после разбора формой, она понимает
+        # любые написания true, которые понимает и сама фильтрация.
+        filterset = self.filterset_class(request.query_params,
+                                         request=request)
+        if not filterset.is_valid():
+            return False
+        return not any(filterset.form.cleaned_data.get(name)
+                       for name in self.user_filters)
+
+    def list(self, request, *args, **kwargs):
+        if not self.is_feed_cacheable(request):
+            return super().list(request, *args, **kwargs)
+        key = get_recipe_feed_key(request)
+        data = cache.get(key)
+        if data is None:
+            self.shared_rendering = True
+            try:
+                with read_from_primary():
+                    response = super().list(request, *args, **kwargs)
+            finally:
+                self.shared_rendering = False
+            if response.status_code != 200:
+                return response
+            data = response.data
+            cache.set(key, data, settings.RECIPE_FEED_CACHE_TIMEOUT)
+        if request.user.is_authenticated:
+            data = self.apply_user_overlay(data, request.user, key)
+        return Response(data)
+
+    def get_user_overlay(self, user, recipes, feed_key):
+        key = get_recipe_overlay_key(user.id, feed_key)
+        overlay = cache.get(key)
+        if overlay is None:
+            recipe_ids = [recipe['id'] for recipe in recipes]
+            author_ids = {recipe['author']['id'] for recipe in recipes}
+            with read_from_primary():
+                overlay = self.load_user_overlay(
+                    user, recipe_ids, author_ids)
+            cache.set(key, overlay, settings.RECIPE_FEED_CACHE_TIMEOUT)
+        return overlay
+
+    def load_user_overlay(self, user, recipe_ids, author_ids):
+        return (
+            set(Favorite.objects.filter(
+                user=user, recipe_id__in=recipe_ids
+            ).values_list('recipe_id', flat=True)),
+            set(ShopList.objects.filter(
+                user=user, recipe_id__in=recipe_ids
+            ).values_list('recipe_id', flat=True)),
+            set(Follow.objects.filter(
+                user=user, following_id__in=author_ids
+            ).values_list('following_id', flat=True)),
+        )
+
+    def apply_user_overlay(self, data, user, feed_key):
+        recipes = data['results']
+        if not recipes:
+            return data
+        favorited, in_cart, subscribed = self.get_user_overlay(
+            user, recipes, feed_key)
+        results = []
+        for recipe in recipes:
+            recipe = dict(recipe)
+            recipe['author'] = dict(
+                recipe['author'],
+                is_subscribed=recipe['author']['id'] in subscribed)
+            recipe['is_favorited'] = recipe['id'] in favorited
+            recipe['is_in_shopping_cart'] = recipe['id'] in in_cart
+            results.append(recipe)
+        return dict(data, results=results)
+
+
+class ReplicaReadMixin:
+    """ Безопасные запросы читают из реплик. Аутентификация и записи
+        идут в основную базу, после записи пользователь какое-то
+        время читает из основной базы. Действия из primary_actions
+        всегда читают из основной базы. """
+
+    primary_actions = ()
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        user_id = request.user.pk
+        if (request.method in SAFE_METHODS
+                and self.action not in self.primary_actions
+                and not (user_id and is_pinned_to_primary(user_id))):
+            self.replica_token = use_replica.set(True)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        token = getattr(self, 'replica_token', None)
+        if token is not None:
+            use_replica.reset(token)
+            self.replica_token = None
+        elif request.method not in SAFE_METHODS and request.user.pk:
+            pin_to_primary(request.user.pk)
+        return super().finalize_response(request, response, *args, **kwargs)
@@ -1,6 +1,10 @@
+from collections import defaultdict
+
 from django.conf import settings
 from django.core.validators import MinValueValidator
 from django.db import models
+from django.db.models import Exists, F, OuterRef, Prefetch, Value, Window
+from django.db.models.functions import RowNumber
 
 
 class Tag(models.Model):
@@ -35,11 +39,66 @@ class Ingredient(models.Model):
     class Meta:
         verbose_name = 'Ингредиент'
         verbose_name_plural = 'Ингредиенты'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['name', 'measurement_unit'],
+                name='unique_ingredient_unit')]
 
     def __str__(self):
         return f"{self.name}"
 
 
+class RecipeQuerySet(models.QuerySet):
+    """ Набор запросов для рецептов с подгрузкой связанных объектов
+        и флагами текущего пользователя. """
+
+    def with_related(self):
+        return self.select_related('author').prefetch_related(
+            Prefetch('tags', queryset=Tag.objects.order_by('id')),
+            Prefetch('ingredients_in_recipe',
+                     queryset=RecipeIngredient.objects.select_related(
+                         'ingredient').order_by('id')),
+        )
+
+    def with_user_flags(self, user):
+        if not user.is_authenticated:
+            return self.annotate(
+                is_favorited=Value(False, output_field=models.BooleanField()),
+                is_in_shopping_cart=Value(
+                    False, output_field=models.BooleanField()),
+                author_is_subscribed=Value(
+                    False, output_field=models.BooleanField()),
+            )
+        return self.annotate(
+            is_favorited=Exists(Favorite.objects.filter(
+                user=user, recipe=OuterRef('pk'))),
+            is_in_shopping_cart=Exists(ShopList.objects.filter(
+                user=user, recipe=OuterRef('pk'))),
+            author_is_subscribed=Exists(Follow.objects.filter(
+                user=user, following=OuterRef('author'))),
+        )
+
+    def latest_by_author(self, author_ids, limit=None):
+        """ Последние рецепты авторов одним запросом,
+            не больше limit на каждого автора. """
+        queryset = self.filter(author_id__in=author_ids)
+        if limit is not None:
+            ranked = queryset.annotate(recipe_rank=Window(
+                expression=RowNumber(),
+                partition_by=[F('author_id')],
+                order_by=F('id').desc(),
+            ))
+            sql, params = ranked.query.sql_with_params()
+            queryset = self.raw(
+                f'SELECT * FROM ({sql}) ranked '
+                f'WHERE recipe_rank <= %s ORDER BY id DESC',
+                (*params, limit))
+        recipes = defaultdict(list)
+        for recipe in queryset:
+            recipes[recipe.author_id].append(recipe)
+        return recipes
+
+
 class Recipe(models.Model):
     """ Модель Рецепт. """
     tags = models.ManyToManyField(Tag,
@@ -55,12 +114,23 @@ class Recipe(models.Model):
     name = models.CharField(max_length=200,
                             verbose_name='Название рецепта')
     image = models.ImageField(verbose_name='Фото рецепта')
+    image_processed = models.BooleanField(
+        default=False,
+        verbose_name='Миниатюры созданы')
+    favorites_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='В избранном')
+    carts_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='В списках покупок')
     text = models.TextField(verbose_name='Описание рецепта')
     cooking_time = models.PositiveSmallIntegerField(
         verbose_name='Время приготовления',
         default=1,
         validators=[MinValueValidator(1, message='Не может быть равно нулю')])
 
+    objects = RecipeQuerySet.as_manager()
+
     class Meta:
         ordering = ['-id']
         verbose_name = 'Рецепт'
@@ -121,6 +191,9 @@ class Favorite(models.Model):
                              related_name='user')
     recipe = models.ForeignKey(Recipe, on_delete=models.CASCADE,
                                related_name='favorite_recipe')
+    created = models.DateTimeField(auto_now_add=True,
+                                   db_index=True,
+                                   verbose_name='Дата добавления')
 
     class Meta:
         verbose_name = 'Избранное'
@@ -139,6 +212,9 @@ class ShopList(models.Model):
                                  related_name='cart_recipe')
     recipe = models.ForeignKey(Recipe, on_delete=models.CASCADE,
                                related_name='cart_recipe')
+    created = models.DateTimeField(auto_now_add=True,
+                                   db_index=True,
+                                   verbose_name='Дата добавления')
 
     class Meta:
         verbose_name = 'Список покупок'
@@ -147,3 +223,110 @@ class ShopList(models.Model):
             models.UniqueConstraint(
                 fields=['user', 'recipe'],
                 name='unique_customer_recipe')]
+
+
+class ShoppingCartIngredient(models.Model):
+    """ Модель для суммы ингредиентов в списке покупок пользователя.
+        Обновляется при изменении списка покупок и рецептов в нем. """
+    user = models.ForeignKey(settings.AUTH_USER_MODEL,
+                             on_delete=models.CASCADE,
+                             related_name='cart_ingredients')
+    ingredient = models.ForeignKey(Ingredient,
+                                   on_delete=models.CASCADE,
+                                   related_name='cart_ingredients',
+                                   verbose_name='Ингредиент')
+    total_amount = models.IntegerField(default=0,
+                                       verbose_name='Количество')
+
+    class Meta:
+        verbose_name = 'Ингредиент в списке покупок'
+        verbose_name_plural = 'Ингредиенты в списках покупок'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'ingredient'],
+                name='unique_cart_ingredient')]
+
+
+class FeedEntry(models.Model):
+    """ Модель для записи ленты подписок пользователя. Записи создаются
+        при публикации рецепта для каждого подписчика автора. """
+    user = models.ForeignKey(settings.AUTH_USER_MODEL,
+                             on_delete=models.CASCADE,
+                             related_name='feed_entries')
+    recipe = models.ForeignKey(Recipe,
+                               on_delete=models.CASCADE,
+                               related_name='feed_entries')
+    author = models.ForeignKey(settings.AUTH_USER_MODEL,
+                               on_delete=models.CASCADE,
+                               related_name='+',
+                               verbose_name='Автор рецепта')
+
+    class Meta:
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Записи ленты'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'recipe'],
+                name='unique_feed_entry')]
+        indexes = [
+            models.Index(fields=['user', 'author'],
+                         name='feed_entry_user_author_idx')]
+
+
+class RecipePopularity(models.Model):
+    """ Модель для предрассчитанной популярности рецептов. """
+    recipe = models.OneToOneField(Recipe,
+                                  on_delete=models.CASCADE,
+                                  primary_key=True,
+                                  related_name='popularity')
+    score = models.FloatField(default=0,
+                              db_index=True,
+                              verbose_name='Популярность')
+    updated_at = models.DateTimeField(verbose_name='Дата пересчета')
+
+    class Meta:
+        verbose_name = 'Популярность рецепта'
+        verbose_name_plural = 'Популярность рецептов'
+
+
+class PopularityWatermark(models.Model):
+    """ Модель для отметки пересчета популярности по типу событий.
+        recent_ids - уже учтенные события из окна перекрытия. """
+    event = models.CharField(max_length=50,
+                             primary_key=True,
+                             verbose_name='Событие')
+    refreshed_at = models.DateTimeField(verbose_name='Дата пересчета')
+    recent_ids = models.JSONField(default=list,
+                                  verbose_name='Учтенные события')
+
+    class Meta:
+        verbose_name = 'Отметка пересчета популярности'
+        verbose_name_plural = 'Отметки пересчета популярности'
+
+
+class RecipeSearchDocument(models.Model):
+    """ Модель для поискового документа рецепта.
+        На PostgreSQL к таблице добавлен tsvector с GIN индексом. """
+    recipe = models.OneToOneField(Recipe,
+                                  on_delete=models.CASCADE,
+                                  primary_key=True,
+                                  related_name='search_document')
+    title = models.TextField(verbose_name='Название')
+    body = models.TextField(verbose_name='Описание и ингредиенты')
+
+    class Meta:
+        verbose_name = 'Поисковый документ'
+        verbose_name_plural = 'Поисковые документы'
+
+
+class PendingFileDeletion(models.Model):
+    """ Модель для файлов, которые нужно удалить после delete_after:
+        исходные изображения рецептов после обработки. """
+    name = models.CharField(max_length=255,
+                            verbose_name='Файл')
+    delete_after = models.DateTimeField(db_index=True,
+                                        verbose_name='Удалить после')
+
+    class Meta:
+        verbose_name = 'Файл к удалению'
+        verbose_name_plural = 'Файлы к удалению'
@@ -1,6 +1,111 @@
-from rest_framework.pagination import PageNumberPagination
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import EmptyResultSet
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import (CursorPagination, Cursor,
+                                       PageNumberPagination)
+from rest_framework.response import Response
 
 
 class LimitPageNumberPagination(PageNumberPagination):
     page_size = 6
     page_size_query_param = 'limit'
+
+
+class LimitCursorPagination(CursorPagination):
+    """ Пагинация по ключу -id без OFFSET и COUNT(*).
+        Общее количество считается только по запросу ?count=true
+        и кэшируется. """
+
+    page_size = 6
+    page_size_query_param = 'limit'
+    ordering = '-id'
+    count_query_param = 'count'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.count = None
+        if request.query_params.get(self.count_query_param) in ('1', 'true'):
+            self.count = self.get_count(queryset)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_count(self, queryset):
+        try:
+            sql, params = queryset.query.sql_with_params()
+        except EmptyResultSet:
+            return 0
+        key = 'pagination_count:' + hashlib.md5(
+            f'{sql}{params}'.encode('utf-8')).hexdigest()
+        count = cache.get(key)
+        if count is None:
+            count = queryset.count()
+            cache.set(key, count, settings.CURSOR_PAGINATION_COUNT_TIMEOUT)
+        return count
+
+    def get_paginated_response(self, data):
+        payload = [
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]
+        if self.count is not None:
+            payload.insert(0, ('count', self.count))
+        return Response(dict(payload))
+
+
+class FeedPagination(LimitCursorPagination):
+    """ Курсор ленты подписок: позиция - id последнего рецепта
+        на странице, страница читается по ключу без OFFSET. """
+
+    max_page_size = 100
+
+    def paginate_ids(self, request, get_ids):
+        """ get_ids(before, limit) возвращает id рецептов по убыванию. """
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        cursor = self.decode_cursor(request)
+        before = None
+        if cursor is not None and cursor.position is not None:
+            try:
+                before = int(cursor.position)
+            except ValueError:
+                raise NotFound(self.invalid_cursor_message)
+        ids = get_ids(before, self.page_size + 1)
+        self.has_next = len(ids) > self.page_size
+        ids = ids[:self.page_size]
+        self.position = ids[-1] if ids else None
+        return ids
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        return self.encode_cursor(
+            Cursor(offset=0, reverse=False, position=self.position))
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': None,
+            'results': data,
+        })
+
+
+class CursorPaginationMixin:
+    """ Клиент включает курсорную пагинацию параметром
+        ?pagination=cursor, по умолчанию остается постраничная. """
+
+    cursor_pagination_class = LimitCursorPagination
+    pagination_mode_query_param = 'pagination'
+
+    def use_cursor_pagination(self):
+        mode = self.request.query_params.get(self.pagination_mode_query_param)
+        return mode == 'cursor'
+
+    @property
+    def paginator(self):
+        if not self.use_cursor_pagination():
+            return super().paginator
+        if not hasattr(self, '_paginator'):
+            self._paginator = self.cursor_pagination_class()
+        return self._paginator
@@ -0,0 +1,96 @@
+import math
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Max
+from django.utils import timezone
+
+from .cache import invalidate_recipe_feed
+from .models import Favorite, PopularityWatermark, RecipePopularity, ShopList
+
+EVENTS = {
+    Favorite: 'favorite',
+    ShopList: 'shopping_cart',
+}
+
+
+def decay(seconds):
+    half_life = settings.POPULARITY_HALF_LIFE_HOURS * 60 * 60
+    return 0.5 ** (seconds / half_life)
+
+
+def get_horizon():
+    """ Возраст, после которого событие дает меньше POPULARITY_MIN_SCORE. """
+    weight = max(settings.POPULARITY_WEIGHTS.values())
+    return timedelta(hours=settings.POPULARITY_HALF_LIFE_HOURS * math.log2(
+        weight / settings.POPULARITY_MIN_SCORE))
+
+
+def collect_gains(model, watermark, now, gains):
+    """ Добавляет в gains вклад новых событий с учетом давности.
+        События ищутся с перекрытием с прошлым пересчетом, чтобы учесть
+        транзакции, закоммиченные после него, а уже учтенные события
+        из окна перекрытия пропускаются. Возвращает id учтенных
+        событий нового окна перекрытия. """
+    weight = settings.POPULARITY_WEIGHTS[EVENTS[model]]
+    overlap = timedelta(seconds=settings.POPULARITY_OVERLAP_SECONDS)
+    start = now - get_horizon()
+    processed = set()
+    if watermark.refreshed_at is not None:
+        start = max(start, watermark.refreshed_at - overlap)
+        processed = set(watermark.recent_ids)
+    recent = []
+    rows = model.objects.filter(
+        created__gt=start, created__lte=now
+    ).values_list('id', 'recipe_id', 'created').iterator()
+    for pk, recipe_id, created in rows:
+        if created > now - overlap:
+            recent.append(pk)
+        if pk not in processed:
+            gains[recipe_id] += weight * decay(
+                (now - created).total_seconds())
+    return recent
+
+
+def get_watermarks():
+    watermarks = PopularityWatermark.objects.select_for_update().in_bulk()
+    return {event: watermarks.get(event) or PopularityWatermark(event=event)
+            for event in EVENTS.values()}
+
+
+@transaction.atomic
+def refresh_popularity(now=None):
+    """ Инкрементально обновляет популярность: старые оценки затухают
+        одним UPDATE, добавляются только события с прошлого пересчета. """
+    now = now or timezone.now()
+    watermarks = get_watermarks()
+    since = min((watermark.refreshed_at for watermark in watermarks.values()
+                 if watermark.refreshed_at is not None), default=None)
+    if since is None:
+        since = RecipePopularity.objects.aggregate(
+            last=Max('updated_at'))['last']
+    if since is not None:
+        RecipePopularity.objects.update(
+            score=F('score') * decay((now - since).total_seconds()),
+            updated_at=now)
+        RecipePopularity.objects.filter(
+            score__lt=settings.POPULARITY_MIN_SCORE).delete()
+    gains = defaultdict(float)
+    for model, event in EVENTS.items():
+        watermark = watermarks[event]
+        watermark.recent_ids = collect_gains(model, watermark, now, gains)
+        watermark.refreshed_at = now
+        watermark.save()
+    existing = RecipePopularity.objects.in_bulk(list(gains))
+    for recipe_id, popularity in existing.items():
+        popularity.score += gains[recipe_id]
+    RecipePopularity.objects.bulk_update(existing.values(), ['score'])
+    RecipePopularity.objects.bulk_create(
+        [RecipePopularity(recipe_id=recipe_id, score=score, updated_at=now)
+         for recipe_id, score in gains.items()
+         if recipe_id not in existing],
+        ignore_conflicts=True)
+    transaction.on_commit(invalidate_recipe_feed)
+    return len(gains)
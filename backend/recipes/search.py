@@ -0,0 +1,268 @@
+import re
+import threading
+from bisect import bisect_left
+from collections import defaultdict
+
+from django.db import connection, transaction
+from django.db.models import (BooleanField, Case, FloatField, IntegerField,
+                              OuterRef, Subquery, Value, When)
+from django.db.models.expressions import RawSQL
+
+from config.db.routers import read_from_primary
+from .cache import (RECIPE_FEED_VERSION_KEY, get_reference_version,
+                    get_version, invalidate_recipe_feed)
+from .models import Ingredient, Recipe, RecipeIngredient, RecipeSearchDocument
+
+TOKEN_RE = re.compile(r'\w+')
+
+
+class IngredientPrefixIndex:
+    """ Отсортированный список названий ингредиентов в памяти процесса.
+        Используется для поиска на базах без индекса pg_trgm.
+        Пересобирается, когда меняется версия справочника ингредиентов
+        в общем кэше, в том числе после изменений в других процессах. """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._names = None
+        self._ids = None
+        self._version = None
+
+    def invalidate(self):
+        with self._lock:
+            self._names = self._ids = self._version = None
+
+    def _load(self):
+        # Версия читается до загрузки: изменение во время загрузки
+        # сменит ее еще раз, и индекс пересоберется при следующем поиске.
+        version, _ = get_reference_version('ingredients')
+        with self._lock:
+            if self._names is None or self._version != version:
+                with read_from_primary():
+                    rows = sorted(
+                        (name.lower(), pk) for pk, name
+                        in Ingredient.objects.values_list('id', 'name'))
+                self._names = [name for name, _ in rows]
+                self._ids = [pk for _, pk in rows]
+                self._version = version
+            return self._names, self._ids
+
+    def search(self, term, limit=None):
+        """ id ингредиентов: сначала совпадения по началу названия,
+            затем по вхождению, каждая группа по алфавиту. """
+        names, ids = self._load()
+        term = term.lower()
+        start = bisect_left(names, term)
+        end = start
+        while end < len(names) and names[end].startswith(term):
+            end += 1
+        result = ids[start:end]
+        if limit is not None and len(result) >= limit:
+            return result[:limit]
+        for position, name in enumerate(names):
+            if start <= position < end:
+                continue
+            if term in name:
+                result.append(ids[position])
+                if limit is not None and len(result) >= limit:
+                    break
+        return result
+
+
+ingredient_index = IngredientPrefixIndex()
+
+
+def search_ingredients(queryset, term, limit=None):
+    if connection.vendor == 'postgresql':
+        # Сначала совпадения по началу названия: запрос LIKE 'term%' идет
+        # по индексу text_pattern_ops, затем вхождения по индексу pg_trgm.
+        ordered = queryset.order_by('name').values_list('pk', flat=True)
+        prefix = ordered.filter(name__istartswith=term)
+        ids = list(prefix[:limit] if limit else prefix)
+        if limit is None or len(ids) < limit:
+            contains = ordered.filter(name__icontains=term).exclude(
+                name__istartswith=term)
+            ids += list(contains[:limit - len(ids)] if limit else contains)
+        return filter_by_ids(queryset, ids)
+    return filter_by_ids(queryset, ingredient_index.search(term, limit))
+
+
+def filter_by_ids(queryset, ids):
+    """ Оставляет объекты из списка ids в порядке этого списка. """
+    if not ids:
+        return queryset.none()
+    return queryset.filter(pk__in=ids).order_by(
+        Case(*[When(pk=pk, then=Value(position))
+               for position, pk in enumerate(ids)],
+             output_field=IntegerField()))
+
+
+def tokenize(text):
+    return [token for token in TOKEN_RE.findall(text.lower())
+            if len(token) > 1]
+
+
+class RecipeInvertedIndex:
+    """ Инвертированный индекс рецептов в памяти процесса.
+        Используется вместо tsvector на базах кроме PostgreSQL.
+        Изменения этого процесса вносятся на месте, а после смены
+        версии ленты рецептов в общем кэше индекс загружается заново. """
+
+    title_weight = 2.0
+    body_weight = 1.0
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._postings = None
+        self._documents = {}
+        self._tokens = []
+        self._version = None
+
+    def invalidate(self):
+        with self._lock:
+            self._postings = None
+            self._documents = {}
+            self._tokens = []
+            self._version = None
+
+    def _add(self, recipe_id, title, body):
+        weights = defaultdict(float)
+        for token in tokenize(title):
+            weights[token] += self.title_weight
+        for token in tokenize(body):
+            weights[token] += self.body_weight
+        for token, weight in weights.items():
+            self._postings[token][recipe_id] = weight
+        self._documents[recipe_id] = set(weights)
+
+    def _remove(self, recipe_id):
+        for token in self._documents.pop(recipe_id, ()):
+            postings = self._postings[token]
+            postings.pop(recipe_id, None)
+            if not postings:
+                del self._postings[token]
+
+    def _load(self, version):
+        if self._postings is None or self._version != version:
+            self._postings = defaultdict(dict)
+            self._documents = {}
+            with read_from_primary():
+                rows = RecipeSearchDocument.objects.values_list(
+                    'recipe_id', 'title', 'body').iterator()
+                for recipe_id, title, body in rows:
+                    self._add(recipe_id, title, body)
+            self._tokens = sorted(self._postings)
+            self._version = version
+
+    def update(self, recipe_id, title, body):
+        with self._lock:
+            if self._postings is None:
+                return
+            self._remove(recipe_id)
+            self._add(recipe_id, title, body)
+            self._tokens = sorted(self._postings)
+
+    def remove(self, recipe_id):
+        with self._lock:
+            if self._postings is None:
+                return
+            self._remove(recipe_id)
+            self._tokens = sorted(self._postings)
+
+    def _match(self, term):
+        """ Веса рецептов для слов, начинающихся с term. """
+        matched = defaultdict(float)
+        position = bisect_left(self._tokens, term)
+        while (position < len(self._tokens)
+               and self._tokens[position].startswith(term)):
+            for recipe_id, weight in self._postings[
+                    self._tokens[position]].items():
+                matched[recipe_id] += weight
+            position += 1
+        return matched
+
+    def search(self, text):
+        """ id рецептов, содержащих все слова запроса,
+            по убыванию релевантности. """
+        scores = None
+        version = get_version(RECIPE_FEED_VERSION_KEY)
+        with self._lock:
+            self._load(version)
+            for term in tokenize(text):
+                matched = self._match(term)
+                if scores is not None:
+                    matched = {recipe_id: scores[recipe_id] + weight
+                               for recipe_id, weight in matched.items()
+                               if recipe_id in scores}
+                scores = matched
+        if not scores:
+            return []
+        return sorted(scores, key=lambda pk: (-scores[pk], -pk))
+
+
+recipe_index = RecipeInvertedIndex()
+
+
+def get_document(recipe_id):
+    recipe = Recipe.objects.filter(
+        pk=recipe_id).values('name', 'text').first()
+    if recipe is None:
+        return None
+    ingredients = RecipeIngredient.objects.filter(
+        recipe_id=recipe_id).values_list('ingredient__name', flat=True)
+    return recipe['name'], '\n'.join([recipe['text'], *ingredients])
+
+
+def index_recipe(recipe_id):
+    """ Обновляет поисковый документ рецепта. """
+    document = get_document(recipe_id)
+    if document is None:
+        return
+    title, body = document
+    RecipeSearchDocument.objects.update_or_create(
+        recipe_id=recipe_id, defaults={'title': title, 'body': body})
+    recipe_index.update(recipe_id, title, body)
+    # Лента могла быть сброшена раньше, чем записан документ:
+    # другие процессы перечитают индекс уже с ним.
+    invalidate_recipe_feed()
+
+
+@transaction.atomic
+def rebuild_search_index():
+    """ Пересоздает поисковые документы всех рецептов. """
+    ingredients = defaultdict(list)
+    rows = RecipeIngredient.objects.values_list(
+        'recipe_id', 'ingredient__name').iterator()
+    for recipe_id, name in rows:
+        ingredients[recipe_id].append(name)
+    RecipeSearchDocument.objects.all().delete()
+    documents = RecipeSearchDocument.objects.bulk_create([
+        RecipeSearchDocument(
+            recipe_id=recipe_id, title=name,
+            body='\n'.join([text, *ingredients[recipe_id]]))
+        for recipe_id, name, text in Recipe.objects.values_list(
+            'id', 'name', 'text').iterator()
+    ], batch_size=1000)
+    transaction.on_commit(recipe_index.invalidate)
+    transaction.on_commit(invalidate_recipe_feed)
+    return len(documents)
+
+
+def search_recipes(queryset, text):
+    """ Полнотекстовый поиск по названию, описанию и ингредиентам
+        с сортировкой по релевантности. """
+    if connection.vendor == 'postgresql':
+        query = "plainto_tsquery('russian', %s)"
+        documents = RecipeSearchDocument.objects.annotate(
+            matched=RawSQL(f'vector @@ {query}', (text,),
+                           output_field=BooleanField()),
+            rank=RawSQL(f'ts_rank(vector, {query})', (text,),
+                        output_field=FloatField()),
+        ).filter(matched=True)
+        return queryset.filter(
+            pk__in=documents.values('recipe_id')
+        ).annotate(
+            search_rank=Subquery(documents.filter(
+                recipe_id=OuterRef('pk')).values('rank')[:1])
+        ).order_by('-search_rank', '-id')
+    return filter_by_ids(queryset, recipe_index.search(text))
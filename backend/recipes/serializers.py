@@ -1,14 +1,29 @@
-from django.shortcuts import get_object_or_404
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import transaction
 from drf_extra_fields.fields import Base64ImageField
 from rest_framework import serializers
 from rest_framework.validators import UniqueTogetherValidator
 
 from users.models import CustomUser
 from users.serializers import CustomUserSerializer
+from .cart import change_recipe_totals
+from .images import (get_thumbnail_urls, get_thumbnail_urls_by_name,
+                     schedule_image_processing)
 from .models import (Favorite, Follow, Ingredient, Recipe, RecipeIngredient,
                      ShopList, Tag)
 
 
+def get_recipes_limit(request):
+    """ Значение параметра recipes_limit или None. """
+    try:
+        return max(int(request.query_params['recipes_limit']), 0)
+    except (KeyError, ValueError):
+        return None
+
+
 class TagSerializer(serializers.ModelSerializer):
 
     class Meta:
@@ -35,12 +50,13 @@ class RecipeIngredientSerializer(serializers.ModelSerializer):
 
 
 class RecipeSerializer(serializers.ModelSerializer):
-    author = CustomUserSerializer(read_only=True)
+    author = serializers.SerializerMethodField()
     ingredients = RecipeIngredientSerializer(
         many=True,
         required=True, source='ingredients_in_recipe',)
     tags = TagSerializer(many=True)
     image = Base64ImageField()
+    thumbnails = serializers.SerializerMethodField()
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
 
@@ -49,10 +65,26 @@ class RecipeSerializer(serializers.ModelSerializer):
         fields = (
             'id', 'tags', 'author', 'ingredients',
             'is_favorited', 'is_in_shopping_cart',
-            'name', 'image', 'text', 'cooking_time'
+            'name', 'image', 'thumbnails', 'text', 'cooking_time'
         )
 
+    def get_author(self, obj):
+        author = obj.author
+        if hasattr(obj, 'author_is_subscribed'):
+            author.is_subscribed = obj.author_is_subscribed
+        return CustomUserSerializer(author, context=self.context).data
+
+    def get_thumbnails(self, obj):
+        urls = get_thumbnail_urls(obj)
+        request = self.context.get('request')
+        if urls is None or request is None:
+            return urls
+        return {size: request.build_absolute_uri(url)
+                for size, url in urls.items()}
+
     def get_is_favorited(self, obj):
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
         if self.context['request'].user.is_authenticated:
             current_user = self.context['request'].user
             return Favorite.objects.filter(user=current_user,
@@ -60,6 +92,8 @@ class RecipeSerializer(serializers.ModelSerializer):
         return False
 
     def get_is_in_shopping_cart(self, obj):
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
         if self.context['request'].user.is_authenticated:
             current_user = self.context['request'].user
             return ShopList.objects.filter(user=current_user,
@@ -72,6 +106,93 @@ class RecipeSerializer(serializers.ModelSerializer):
         return data
 
 
+class RecipeValuesListSerializer(serializers.ListSerializer):
+
+    def to_representation(self, data):
+        rows = list(data)
+        self.child.load_related(rows)
+        return [self.child.to_representation(row) for row in rows]
+
+
+class RecipeValuesSerializer(serializers.BaseSerializer):
+    """ Сериализатор рецептов только для чтения из строк .values().
+        Отдает тот же JSON, что и RecipeSerializer, без создания
+        моделей и вложенных сериализаторов. Теги и ингредиенты
+        загружаются двумя запросами на всю страницу. """
+
+    values_fields = (
+        'id', 'name', 'image', 'image_processed', 'text', 'cooking_time',
+        'is_favorited', 'is_in_shopping_cart', 'author_is_subscribed',
+        'author_id', 'author__email', 'author__username',
+        'author__first_name', 'author__last_name',
+    )
+    tag_fields = ('id', 'name', 'color', 'slug')
+    ingredient_fields = ('id', 'name', 'measurement_unit', 'amount')
+
+    class Meta:
+        list_serializer_class = RecipeValuesListSerializer
+
+    def load_related(self, rows):
+        recipe_ids = [row['id'] for row in rows]
+        self.tags = defaultdict(list)
+        self.ingredients = defaultdict(list)
+        if not recipe_ids:
+            return
+        tags = Recipe.tags.through.objects.filter(
+            recipe_id__in=recipe_ids
+        ).order_by('tag_id').values_list(
+            'recipe_id', 'tag__id', 'tag__name', 'tag__color', 'tag__slug')
+        for recipe_id, *tag in tags:
+            self.tags[recipe_id].append(dict(zip(self.tag_fields, tag)))
+        ingredients = RecipeIngredient.objects.filter(
+            recipe_id__in=recipe_ids
+        ).order_by('id').values_list(
+            'recipe_id', 'ingredient__id', 'ingredient__name',
+            'ingredient__measurement_unit', 'amount')
+        for recipe_id, *ingredient in ingredients:
+            self.ingredients[recipe_id].append(
+                dict(zip(self.ingredient_fields, ingredient)))
+
+    def get_url(self, url):
+        request = self.context.get('request')
+        if request is None:
+            return url
+        return request.build_absolute_uri(url)
+
+    def get_thumbnails(self, row):
+        urls = get_thumbnail_urls_by_name(row['image'],
+                                          row['image_processed'])
+        if urls is None:
+            return None
+        return {size: self.get_url(url) for size, url in urls.items()}
+
+    def to_representation(self, row):
+        if not hasattr(self, 'tags'):
+            self.load_related([row])
+        image = row['image']
+        return {
+            'id': row['id'],
+            'tags': self.tags[row['id']],
+            'author': {
+                'email': row['author__email'],
+                'id': row['author_id'],
+                'username': row['author__username'],
+                'first_name': row['author__first_name'],
+                'last_name': row['author__last_name'],
+                'is_subscribed': row['author_is_subscribed'],
+            },
+            'ingredients': self.ingredients[row['id']],
+            'is_favorited': row['is_favorited'],
+            'is_in_shopping_cart': row['is_in_shopping_cart'],
+            'name': row['name'],
+            'image': (self.get_url(default_storage.url(image))
+                      if image else None),
+            'thumbnails': self.get_thumbnails(row),
+            'text': row['text'],
+            'cooking_time': row['cooking_time'],
+        }
+
+
 class CreateIngredientRecipeSerializer(serializers.ModelSerializer):
     """ Сериализатор для модели Ингредиенты в рецептах. """
 
@@ -98,57 +219,87 @@ class RecipesCreateSerializer(serializers.ModelSerializer):
         )
 
     def validate(self, data):
-        ingredients = data['ingredients']
-        ingredient_list = []
-        for items in ingredients:
-            ingredient = Ingredient.objects.get(id=items['id'])
-            if ingredient in ingredient_list:
+        if 'ingredients' in data:
+            ingredient_ids = [item['id'] for item in data['ingredients']]
+            if len(set(ingredient_ids)) != len(ingredient_ids):
                 raise serializers.ValidationError(
                     'Ингредиенты должны быть уникальными!')
-            ingredient_list.append(ingredient)
-        tags = data['tags']
-        tags_list = []
-        for tag in tags:
-            if tag in tags_list:
+            found = Ingredient.objects.in_bulk(ingredient_ids)
+            missing = set(ingredient_ids) - found.keys()
+            if missing:
                 raise serializers.ValidationError(
-                    'Тэги должны быть уникальными!'
-                )
-            tags_list.append(tag)
-        return data
-
-    def create_ingredients(self, ingredients, recipe):
-        create_ingredient = [
-            RecipeIngredient(
-                recipe=recipe,
-                ingredient=get_object_or_404(Ingredient, pk=ingredient["id"]),
-                amount=ingredient['amount']
+                    f'Ингредиенты не найдены: {sorted(missing)}')
+        if 'tags' in data and len(set(data['tags'])) != len(data['tags']):
+            raise serializers.ValidationError(
+                'Тэги должны быть уникальными!'
             )
-            for ingredient in ingredients]
-        RecipeIngredient.objects.bulk_create(create_ingredient)
+        return data
 
+    def set_ingredients(self, recipe, ingredients, created=False):
+        """ Приводит ингредиенты рецепта к переданному списку,
+            меняя только отличающиеся строки. """
+        amounts = {item['id']: item['amount'] for item in ingredients}
+        existing = {} if created else {
+            item.ingredient_id: item
+            for item in recipe.ingredients_in_recipe.all()}
+        deltas = {}
+        to_delete = []
+        to_update = []
+        for ingredient_id, item in existing.items():
+            amount = amounts.get(ingredient_id)
+            if amount is None:
+                to_delete.append(item.id)
+                deltas[ingredient_id] = -item.amount
+            elif item.amount != amount:
+                deltas[ingredient_id] = amount - item.amount
+                item.amount = amount
+                to_update.append(item)
+        to_create = [
+            RecipeIngredient(recipe=recipe, ingredient_id=ingredient_id,
+                             amount=amount)
+            for ingredient_id, amount in amounts.items()
+            if ingredient_id not in existing]
+        deltas.update((item.ingredient_id, item.amount) for item in to_create)
+        if to_delete:
+            RecipeIngredient.objects.filter(id__in=to_delete).delete()
+        if to_update:
+            RecipeIngredient.objects.bulk_update(to_update, ['amount'])
+        if to_create:
+            RecipeIngredient.objects.bulk_create(to_create)
+        if not created:
+            change_recipe_totals(recipe.pk, deltas)
+
+    @transaction.atomic
     def create(self, validated_data):
         ingredients = validated_data.pop('ingredients')
         tags = validated_data.pop('tags')
         recipe = Recipe.objects.create(**validated_data)
-        recipe.tags.add(*tags)
-        self.create_ingredients(ingredients, recipe)
+        recipe.tags.set(tags)
+        self.set_ingredients(recipe, ingredients, created=True)
+        schedule_image_processing(recipe)
         return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
-        instance.ingredients.clear()
-        ingredients = validated_data.pop('ingredients')
-        tags = validated_data.pop('tags')
-        self.create_ingredients(ingredients, instance)
-        instance.tags.clear()
-        for tag in tags:
-            instance.tags.add(tag)
+        ingredients = validated_data.pop('ingredients', None)
+        tags = validated_data.pop('tags', None)
+        if ingredients is not None:
+            self.set_ingredients(instance, ingredients)
+        if tags is not None:
+            instance.tags.set(tags)
+        if 'image' in validated_data:
+            validated_data['image_processed'] = False
+            schedule_image_processing(instance)
         return super().update(instance, validated_data)
 
     def to_representation(self, instance):
+        request = self.context.get('request')
+        instance = Recipe.objects.with_related().with_user_flags(
+            request.user).get(pk=instance.pk)
         return RecipeSerializer(
             instance,
             context={
-                'request': self.context.get('request')
+                'request': request
             }).data
 
 
@@ -197,19 +348,22 @@ class FollowSerializer(serializers.ModelSerializer):
 
 
     def get_is_subscribed(self, obj):
-        return Follow.objects.filter(
-            user=obj.user, following=obj.following).exists()
+        # Объект подписки существует, значит пользователь подписан.
+        return True
 
     def get_recipes(self, obj):
-        request = self.context['request']
-        limit = request.GET.get('recipes_limit')
-        queryset = Recipe.objects.filter(author=obj.following)
-        if limit:
-            queryset = queryset[:int(limit)]
+        recipes_by_author = self.context.get('recipes_by_author')
+        if recipes_by_author is not None:
+            queryset = recipes_by_author.get(obj.following_id, [])
+        else:
+            queryset = Recipe.objects.filter(author=obj.following)
+            limit = get_recipes_limit(self.context['request'])
+            if limit is not None:
+                queryset = queryset[:limit]
         return RecipeFollowSerializer(queryset, many=True).data
 
     def get_recipes_count(self, obj):
-        return Recipe.objects.filter(author=obj.following).count()
+        return obj.following.recipes_count
 
 
 class FollowCreateSerializer(serializers.ModelSerializer):
@@ -237,3 +391,17 @@ class FollowCreateSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError(
                 ['flw_self'])
         return data
+
+    @transaction.atomic
+    def create(self, validated_data):
+        # Счетчик подписчиков меняется в сигнале в той же транзакции.
+        return super().create(validated_data)
+
+
+class RecipeIdsSerializer(serializers.Serializer):
+    """ Список id рецептов для массовых операций. """
+    recipes = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=settings.BULK_RECIPES_LIMIT,
+    )
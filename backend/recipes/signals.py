@@ -0,0 +1,145 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_delete)
+from django.dispatch import receiver
+
+from .cache import (invalidate_recipe_feed, invalidate_reference,
+                    invalidate_shopping_list, invalidate_user_state)
+from .cart import add_to_cart_totals, remove_from_cart_totals
+from .counters import (change_followers_count, change_recipe_counter,
+                       change_recipes_count)
+from .feed import (fan_out_recipe, follow_author, followers_changed,
+                   unfollow_author)
+from .jobs import schedule_job
+from .models import (Favorite, Follow, Ingredient, Recipe, RecipeIngredient,
+                     ShopList, Tag)
+from .search import index_recipe, recipe_index
+
+
+@receiver([post_save, post_delete], sender=ShopList)
+def shop_list_changed(sender, instance, **kwargs):
+    invalidate_shopping_list(instance.user_id)
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_changed(sender, instance, **kwargs):
+    invalidate_shopping_list(*ShopList.objects.filter(
+        recipe=instance).values_list('user_id', flat=True))
+
+
+@receiver(post_save, sender=ShopList)
+def cart_recipe_added(sender, instance, created, **kwargs):
+    if created:
+        add_to_cart_totals(instance.user_id, [instance.recipe_id])
+
+
+@receiver(pre_delete, sender=ShopList)
+def cart_recipe_removed(sender, instance, **kwargs):
+    # До удаления, пока ингредиенты рецепта на месте: при каскадном
+    # удалении рецепта pre_delete приходит раньше удаления строк.
+    remove_from_cart_totals(instance.user_id, [instance.recipe_id])
+
+
+@receiver(post_save, sender=Ingredient)
+def ingredient_changed(sender, instance, **kwargs):
+    invalidate_shopping_list(*ShopList.objects.filter(
+        recipe__ingredients=instance
+    ).values_list('user_id', flat=True).distinct())
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_document_changed(sender, instance, **kwargs):
+    # Ингредиенты рецепта сохраняются после самого рецепта,
+    # поэтому документ собирается после коммита.
+    transaction.on_commit(lambda: index_recipe(instance.pk))
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_document_deleted(sender, instance, **kwargs):
+    recipe_index.remove(instance.pk)
+
+
+@receiver([post_save, post_delete], sender=Tag)
+def tag_reference_changed(sender, **kwargs):
+    invalidate_reference('tags')
+
+
+@receiver([post_save, post_delete], sender=Ingredient)
+def ingredient_reference_changed(sender, **kwargs):
+    # После коммита, иначе индекс ингредиентов другого процесса
+    # может загрузить старые данные с новой версией.
+    transaction.on_commit(lambda: invalidate_reference('ingredients'))
+
+
+@receiver([post_save, post_delete], sender=Recipe)
+@receiver([post_save, post_delete], sender=RecipeIngredient)
+@receiver([post_save, post_delete], sender=Tag)
+@receiver([post_save, post_delete], sender=Ingredient)
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def recipe_feed_changed(sender, **kwargs):
+    # Сброс после коммита, чтобы параллельный запрос
+    # не закэшировал ленту без новых изменений.
+    transaction.on_commit(invalidate_recipe_feed)
+
+
+AUTHOR_FIELDS = {'email', 'username', 'first_name', 'last_name'}
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def author_changed(sender, update_fields=None, **kwargs):
+    if update_fields is None or AUTHOR_FIELDS & set(update_fields):
+        transaction.on_commit(invalidate_recipe_feed)
+
+
+@receiver([post_save, post_delete], sender=Favorite)
+@receiver([post_save, post_delete], sender=ShopList)
+@receiver([post_save, post_delete], sender=Follow)
+def user_state_changed(sender, instance, **kwargs):
+    transaction.on_commit(lambda: invalidate_user_state(instance.user_id))
+
+
+# Счетчики меняются в сигналах, чтобы учесть и каскадное удаление,
+# и удаление через админку. bulk_create сигналов не отправляет,
+# после него счетчики пересчитываются через recount_counters.
+
+@receiver(post_save, sender=Recipe)
+def recipe_published(sender, instance, created, **kwargs):
+    if created:
+        change_recipes_count(instance.author_id, 1)
+        schedule_job(fan_out_recipe, instance.pk)
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_removed(sender, instance, **kwargs):
+    change_recipes_count(instance.author_id, -1)
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_save, sender=ShopList)
+def recipe_listed(sender, instance, created, **kwargs):
+    if created:
+        change_recipe_counter(sender, [instance.recipe_id], 1)
+
+
+@receiver(post_delete, sender=Favorite)
+@receiver(post_delete, sender=ShopList)
+def recipe_unlisted(sender, instance, **kwargs):
+    change_recipe_counter(sender, [instance.recipe_id], -1)
+
+
+@receiver(post_save, sender=Follow)
+def follow_created(sender, instance, created, **kwargs):
+    if created:
+        followers_changed(instance.following_id, *change_followers_count(
+            instance.following_id, 1))
+        transaction.on_commit(lambda: follow_author(
+            instance.user_id, instance.following_id))
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    followers_changed(instance.following_id, *change_followers_count(
+        instance.following_id, -1))
+    transaction.on_commit(lambda: unfollow_author(
+        instance.user_id, instance.following_id))
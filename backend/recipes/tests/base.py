@@ -0,0 +1,29 @@
+from recipes.models import Ingredient, Recipe, RecipeIngredient, Tag
+from users.models import CustomUser
+
+
+def make_user(name, **kwargs):
+    return CustomUser.objects.create_user(
+        email=f'{name}@example.com', username=name, first_name=name,
+        last_name=name, password='Pass-12345', **kwargs)
+
+
+def make_recipe(author, name, tags=(), ingredients=(), **kwargs):
+    """ ingredients - пары (ингредиент, количество). """
+    kwargs.setdefault('image', f'recipes/{name}.jpg')
+    recipe = Recipe.objects.create(
+        author=author, name=name, text=f'{name} text', cooking_time=10,
+        **kwargs)
+    recipe.tags.set(tags)
+    RecipeIngredient.objects.bulk_create([
+        RecipeIngredient(recipe=recipe, ingredient=ingredient, amount=amount)
+        for ingredient, amount in ingredients])
+    return recipe
+
+
+def make_tag(slug):
+    return Tag.objects.create(name=slug, color=f'#{abs(hash(slug)) % 0xffffff:06x}', slug=slug)
+
+
+def make_ingredient(name, unit='г'):
+    return Ingredient.objects.create(name=name, measurement_unit=unit)
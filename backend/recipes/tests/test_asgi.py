@@ -0,0 +1,70 @@
+from asgiref.sync import async_to_sync
+from asgiref.testing import ApplicationCommunicator
+from django.core.asgi import get_asgi_application
+from django.core.cache import cache
+from django.test import TestCase
+from rest_framework.authtoken.models import Token
+
+from recipes.models import Ingredient, ShoppingCartIngredient
+from users.models import CustomUser
+
+
+class ShoppingCartDownloadASGITest(TestCase):
+    """ Скачивание списка покупок через ASGI-приложение. """
+
+    def setUp(self):
+        cache.clear()
+        self.user = CustomUser.objects.create_user(
+            email='cart@example.com', username='cart',
+            first_name='Cart', last_name='User', password='Pass-12345')
+        self.token = Token.objects.create(user=self.user)
+        ingredient = Ingredient.objects.create(
+            name='Мука', measurement_unit='г')
+        ShoppingCartIngredient.objects.create(
+            user=self.user, ingredient=ingredient, total_amount=300)
+
+    def request(self, path, query_string=b''):
+        communicator = ApplicationCommunicator(get_asgi_application(), {
+            'type': 'http',
+            'asgi': {'version': '3.0'},
+            'http_version': '1.1',
+            'method': 'GET',
+            'scheme': 'http',
+            'path': path,
+            'raw_path': path.encode(),
+            'query_string': query_string,
+            'root_path': '',
+            'headers': [
+                (b'host', b'testserver'),
+                (b'authorization', f'Token {self.token.key}'.encode()),
+            ],
+            'client': ('127.0.0.1', 1000),
+            'server': ('testserver', 80),
+        })
+
+        async def run():
+            await communicator.send_input({'type': 'http.request'})
+            start = await communicator.receive_output(timeout=10)
+            body = b''
+            while True:
+                message = await communicator.receive_output(timeout=10)
+                body += message.get('body', b'')
+                if not message.get('more_body'):
+                    break
+            await communicator.wait()
+            return start['status'], body
+
+        return async_to_sync(run)()
+
+    def test_download_with_cold_cache(self):
+        status, body = self.request(
+            '/api/recipes/download_shopping_cart/', b'format=txt')
+        self.assertEqual(status, 200)
+        self.assertIn('* Мука:300г', body.decode('utf-8'))
+
+    def test_download_from_cache(self):
+        first = self.request(
+            '/api/recipes/download_shopping_cart/', b'format=txt')
+        second = self.request(
+            '/api/recipes/download_shopping_cart/', b'format=txt')
+        self.assertEqual(first, second)
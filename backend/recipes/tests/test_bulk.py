@@ -0,0 +1,78 @@
+from unittest import mock
+
+from django.db.models.signals import post_delete
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from recipes.models import Favorite, Recipe, ShopList
+from recipes.utils import bulk_add_obj, bulk_remov_obj
+
+from .base import make_recipe, make_user
+
+
+class BulkRemoveTest(TestCase):
+    """ Массовое удаление держит счетчики в согласии со строками. """
+
+    def setUp(self):
+        self.author = make_user('author')
+        self.user = make_user('reader')
+        self.recipes = [make_recipe(self.author, f'recipe{number}')
+                        for number in range(3)]
+        self.ids = [recipe.pk for recipe in self.recipes]
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def counts(self, field):
+        return dict(Recipe.objects.filter(
+            pk__in=self.ids).values_list('pk', field))
+
+    def test_remove_favorites(self):
+        bulk_add_obj(Favorite, self.user, self.ids)
+        response = self.client.delete(
+            '/api/recipes/favorite/',
+            {'recipes': self.ids[:2]}, format='json')
+        self.assertEqual(response.json(), {'recipes': self.ids[:2]})
+        self.assertEqual(self.counts('favorites_count'),
+                         {self.ids[0]: 0, self.ids[1]: 0, self.ids[2]: 1})
+        self.assertEqual(list(Favorite.objects.values_list(
+            'recipe_id', flat=True)), self.ids[2:])
+
+    def test_clear_cart_sends_delete_signals(self):
+        bulk_add_obj(ShopList, self.user, self.ids)
+        deleted = []
+
+        def receiver(sender, instance, **kwargs):
+            deleted.append(instance.recipe_id)
+
+        post_delete.connect(receiver, sender=ShopList)
+        try:
+            response = self.client.delete(
+                '/api/recipes/shopping_cart/clear/')
+        finally:
+            post_delete.disconnect(receiver, sender=ShopList)
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(sorted(deleted), self.ids)
+        self.assertEqual(set(self.counts('carts_count').values()), {0})
+
+
+class BulkAddTest(TestCase):
+    """ Повтор массового добавления не меняет счетчики второй раз. """
+
+    def setUp(self):
+        author = make_user('author')
+        self.user = make_user('reader')
+        self.ids = [make_recipe(author, f'recipe{number}').pk
+                    for number in range(2)]
+
+    def test_retry_counts_once(self):
+        self.assertEqual(bulk_add_obj(ShopList, self.user, self.ids),
+                         self.ids)
+        self.assertEqual(bulk_add_obj(ShopList, self.user, self.ids), [])
+        self.assertEqual(set(Recipe.objects.filter(
+            pk__in=self.ids).values_list('carts_count', flat=True)), {1})
+
+    def test_user_row_locked_first(self):
+        with mock.patch('recipes.utils.lock_user') as lock_user:
+            bulk_add_obj(Favorite, self.user, self.ids)
+            bulk_remov_obj(Favorite, self.user, self.ids)
+        self.assertEqual(lock_user.call_count, 2)
@@ -0,0 +1,83 @@
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from recipes.cart import find_cart_mismatches, rebuild_cart_totals
+from recipes.models import ShopList, ShoppingCartIngredient
+from recipes.utils import bulk_add_obj
+
+from .base import make_ingredient, make_recipe, make_user
+
+
+class CartTotalsConsistencyTest(TestCase):
+    """ Суммы списка покупок совпадают с посчитанными заново
+        после каждого изменения, в том числе мимо API. """
+
+    def setUp(self):
+        self.author = make_user('author')
+        self.user = make_user('reader')
+        self.salt, self.sugar, self.flour = [
+            make_ingredient(name) for name in ('соль', 'сахар', 'мука')]
+        self.recipes = [
+            make_recipe(self.author, 'soup', ingredients=[
+                (self.salt, 5), (self.flour, 100)]),
+            make_recipe(self.author, 'cake', ingredients=[
+                (self.sugar, 200), (self.flour, 300)]),
+            make_recipe(self.author, 'bread', ingredients=[
+                (self.salt, 10), (self.flour, 500)]),
+        ]
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def totals(self):
+        return dict(ShoppingCartIngredient.objects.filter(
+            user=self.user).values_list('ingredient_id', 'total_amount'))
+
+    def assert_consistent(self):
+        self.assertEqual(find_cart_mismatches(), [])
+        stored = self.totals()
+        rebuild_cart_totals()
+        self.assertEqual(self.totals(), stored)
+
+    def test_api_changes(self):
+        soup, cake, bread = self.recipes
+        response = self.client.post(f'/api/recipes/{soup.pk}/shopping_cart/')
+        self.assertEqual(response.status_code, 201)
+        self.assert_consistent()
+        bulk_add_obj(ShopList, self.user, [cake.pk, bread.pk])
+        self.assert_consistent()
+        self.assertEqual(self.totals(), {
+            self.salt.pk: 15, self.sugar.pk: 200, self.flour.pk: 900})
+        self.client.force_authenticate(self.author)
+        response = self.client.patch(f'/api/recipes/{soup.pk}/', {
+            'ingredients': [{'id': self.salt.pk, 'amount': 7},
+                            {'id': self.sugar.pk, 'amount': 1}]},
+            format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assert_consistent()
+        self.client.force_authenticate(self.user)
+        response = self.client.delete(
+            f'/api/recipes/{cake.pk}/shopping_cart/')
+        self.assertEqual(response.status_code, 204)
+        self.assert_consistent()
+        response = self.client.delete('/api/recipes/shopping_cart/clear/')
+        self.assertEqual(response.status_code, 204)
+        self.assert_consistent()
+        self.assertEqual(self.totals(), {})
+
+    def test_changes_outside_api(self):
+        soup, cake, bread = self.recipes
+        for recipe in self.recipes:
+            ShopList.objects.create(user=self.user, recipe=recipe)
+        other = make_user('other')
+        ShopList.objects.create(user=other, recipe=cake)
+        self.assert_consistent()
+        ShopList.objects.get(user=self.user, recipe=soup).delete()
+        self.assert_consistent()
+        cake.delete()
+        self.assert_consistent()
+        self.assertEqual(self.totals(), {
+            self.salt.pk: 10, self.flour.pk: 500})
+        other.delete()
+        self.user.delete()
+        self.assert_consistent()
+        self.assertFalse(ShoppingCartIngredient.objects.exists())
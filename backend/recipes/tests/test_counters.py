@@ -0,0 +1,87 @@
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from recipes.models import Favorite, Follow, Recipe, ShopList
+from users.models import CustomUser
+
+from .base import make_recipe, make_user
+
+
+class CountersTest(TestCase):
+    """ Счетчики автора не расходятся со строками при любом удалении. """
+
+    def setUp(self):
+        self.author = make_user('author')
+        self.reader = make_user('reader')
+        self.client = APIClient()
+        self.client.force_authenticate(self.reader)
+
+    def counts(self):
+        return CustomUser.objects.values_list(
+            'recipes_count', 'followers_count').get(pk=self.author.pk)
+
+    def test_follow_and_unfollow_through_api(self):
+        url = f'/api/users/{self.author.pk}/subscribe/'
+        self.assertEqual(self.client.post(url).status_code, 201)
+        self.assertEqual(self.counts(), (0, 1))
+        self.assertEqual(self.client.delete(url).status_code, 204)
+        self.assertEqual(self.counts(), (0, 0))
+
+    def test_follower_deleted_with_user(self):
+        Follow.objects.create(user=self.reader, following=self.author)
+        self.reader.delete()
+        self.assertEqual(self.counts(), (0, 0))
+
+    def test_recipe_deleted_outside_api(self):
+        recipe = make_recipe(self.author, 'soup')
+        make_recipe(self.author, 'salad')
+        self.assertEqual(self.counts(), (2, 0))
+        recipe.delete()
+        self.assertEqual(self.counts(), (1, 0))
+
+    def test_recipe_deleted_through_api(self):
+        recipe = make_recipe(self.author, 'soup')
+        self.client.force_authenticate(self.author)
+        response = self.client.delete(f'/api/recipes/{recipe.pk}/')
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(self.counts(), (0, 0))
+
+
+class RecipeCountersTest(TestCase):
+    """ Счетчики избранного и списков покупок меняются и при удалении
+        через админку или вместе с пользователем. """
+
+    def setUp(self):
+        self.recipe = make_recipe(make_user('author'), 'soup')
+        self.reader = make_user('reader')
+        self.client = APIClient()
+        self.client.force_authenticate(self.reader)
+
+    def counts(self):
+        return Recipe.objects.values_list(
+            'favorites_count', 'carts_count').get(pk=self.recipe.pk)
+
+    def test_add_and_remove_through_api(self):
+        for path in ('favorite', 'shopping_cart'):
+            url = f'/api/recipes/{self.recipe.pk}/{path}/'
+            self.assertEqual(self.client.post(url).status_code, 201)
+        self.assertEqual(self.counts(), (1, 1))
+        for path in ('favorite', 'shopping_cart'):
+            url = f'/api/recipes/{self.recipe.pk}/{path}/'
+            self.assertEqual(self.client.delete(url).status_code, 204)
+            self.assertEqual(self.client.delete(url).status_code, 400)
+        self.assertEqual(self.counts(), (0, 0))
+
+    def test_deleted_outside_api(self):
+        favorite = Favorite.objects.create(
+            user=self.reader, recipe=self.recipe)
+        ShopList.objects.create(user=self.reader, recipe=self.recipe)
+        self.assertEqual(self.counts(), (1, 1))
+        favorite.delete()
+        self.assertEqual(self.counts(), (0, 1))
+
+    def test_deleted_with_user(self):
+        Favorite.objects.create(user=self.reader, recipe=self.recipe)
+        ShopList.objects.create(user=self.reader, recipe=self.recipe)
+        self.reader.delete()
+        self.assertEqual(self.counts(), (0, 0))
@@ -0,0 +1,30 @@
+from django.test import SimpleTestCase
+
+from recipes.exporters import PdfExporter
+
+
+class PdfExporterTest(SimpleTestCase):
+
+    def render(self, count):
+        items = [{'ingredient__name': f'Сахар (жёлтый) {number}',
+                  'ingredient__measurement_unit': 'г',
+                  'amount': number} for number in range(count)]
+        return b''.join(PdfExporter().iter_render(items))
+
+    def test_text_with_standard_font(self):
+        pdf = self.render(1)
+        self.assertIn(b'/BaseFont /Helvetica', pdf)
+        self.assertNotIn(b'/FontFile', pdf)
+        self.assertIn('(* Сахар \\(жёлтый\\) 0:0г) Tj'.encode('cp1251'), pdf)
+        self.assertNotIn(b'/Image', pdf)
+
+    def test_cross_reference_table(self):
+        pdf = self.render(100)
+        start = int(pdf.rsplit(b'startxref\n', 1)[1].split()[0])
+        lines = pdf[start:].split(b'\n')
+        self.assertEqual(lines[0], b'xref')
+        size = int(lines[1].split()[1])
+        for number in range(1, size):
+            offset = int(lines[2 + number][:10])
+            self.assertTrue(pdf[offset:].startswith(b'%d 0 obj' % number))
+        self.assertIn(b'/Count 3', pdf)
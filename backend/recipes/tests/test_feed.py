@@ -0,0 +1,83 @@
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from recipes.feed import rebuild_feed
+from recipes.models import FeedEntry, Follow
+
+from .base import make_recipe, make_user
+
+
+class RebuildFeedTest(TestCase):
+
+    def setUp(self):
+        self.author = make_user('author')
+        self.other = make_user('other')
+        self.reader = make_user('reader')
+        self.neighbour = make_user('neighbour')
+        self.recipe = make_recipe(self.author, 'soup')
+        self.stale = make_recipe(self.other, 'salad')
+        Follow.objects.create(user=self.reader, following=self.author)
+        Follow.objects.create(user=self.neighbour, following=self.author)
+        FeedEntry.objects.all().delete()
+
+    def entries(self, user):
+        return list(FeedEntry.objects.filter(user=user).values_list(
+            'recipe_id', flat=True))
+
+    def test_rebuild_selected_users(self):
+        FeedEntry.objects.create(user=self.reader, recipe=self.stale,
+                                 author=self.other)
+        FeedEntry.objects.create(user=self.neighbour, recipe=self.stale,
+                                 author=self.other)
+        self.assertEqual(rebuild_feed([self.reader.pk]), 1)
+        self.assertEqual(self.entries(self.reader), [self.recipe.pk])
+        self.assertEqual(self.entries(self.neighbour), [self.stale.pk])
+
+
+@override_settings(BACKGROUND_JOBS_ASYNC=False, FEED_FANOUT_LIMIT=2)
+class FanOutTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.author = make_user('author')
+        self.readers = [make_user(f'reader{number}') for number in range(3)]
+
+    def follow(self, reader):
+        client = APIClient()
+        client.force_authenticate(reader)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = client.post(f'/api/users/{self.author.pk}/subscribe/')
+        self.assertEqual(response.status_code, 201)
+
+    def unfollow(self, reader):
+        client = APIClient()
+        client.force_authenticate(reader)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = client.delete(
+                f'/api/users/{self.author.pk}/subscribe/')
+        self.assertEqual(response.status_code, 204)
+
+    def entries(self, reader):
+        return list(FeedEntry.objects.filter(user=reader).values_list(
+            'recipe_id', flat=True))
+
+    def test_new_recipe_fanned_out_after_commit(self):
+        self.follow(self.readers[0])
+        with self.captureOnCommitCallbacks(execute=True):
+            recipe = make_recipe(self.author, 'soup')
+        self.assertEqual(self.entries(self.readers[0]), [recipe.pk])
+
+    def test_backfill_when_author_stops_being_celebrity(self):
+        for reader in self.readers:
+            self.follow(reader)
+        with self.captureOnCommitCallbacks(execute=True):
+            recipe = make_recipe(self.author, 'soup')
+        self.assertEqual(FeedEntry.objects.filter(recipe=recipe).count(), 0)
+        # 3 -> 2: автор все еще популярен.
+        self.unfollow(self.readers[0])
+        self.assertEqual(FeedEntry.objects.filter(recipe=recipe).count(), 0)
+        # 2 -> 1: рецепты раскладываются оставшемуся подписчику.
+        self.unfollow(self.readers[1])
+        self.assertEqual(self.entries(self.readers[2]), [recipe.pk])
+        self.assertEqual(self.entries(self.readers[1]), [])
@@ -0,0 +1,44 @@
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from recipes.models import Favorite, ShopList
+from .base import make_recipe, make_user
+
+
+@override_settings(RECIPE_FEED_CACHE=True)
+class RecipeFeedCacheTest(TestCase):
+    """ Фильтры по флагам пользователя не берутся из общей ленты. """
+
+    def setUp(self):
+        cache.clear()
+        self.author = make_user('author')
+        self.user = make_user('reader')
+        self.recipes = [make_recipe(self.author, f'recipe{number}')
+                        for number in range(3)]
+        Favorite.objects.create(user=self.user, recipe=self.recipes[0])
+        ShopList.objects.create(user=self.user, recipe=self.recipes[1])
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def get_ids(self, query):
+        response = self.client.get(f'/api/recipes/?{query}')
+        self.assertEqual(response.status_code, 200)
+        return [recipe['id'] for recipe in response.json()['results']]
+
+    def test_user_filters_any_spelling(self):
+        # Общая лента уже в кэше.
+        self.assertEqual(len(self.get_ids('')), 3)
+        for value in ('1', 'true', 'True', 'TRUE', 'tRuE'):
+            with self.subTest(value=value):
+                self.assertEqual(self.get_ids(f'is_favorited={value}'),
+                                 [self.recipes[0].id])
+                self.assertEqual(
+                    self.get_ids(f'is_in_shopping_cart={value}'),
+                    [self.recipes[1].id])
+
+    def test_false_values_use_shared_feed(self):
+        for value in ('0', 'false', 'FALSE', ''):
+            with self.subTest(value=value):
+                self.assertEqual(len(self.get_ids(f'is_favorited={value}')),
+                                 3)
@@ -0,0 +1,95 @@
+import io
+import shutil
+import tempfile
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from PIL import Image
+from rest_framework.test import APIClient
+
+from recipes.images import get_thumbnail_names, process_recipe_image
+from recipes.models import PendingFileDeletion
+from .base import make_recipe, make_user
+
+
+@override_settings(RECIPE_FEED_CACHE=True)
+class ProcessRecipeImageTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        media_settings = override_settings(MEDIA_ROOT=media_root)
+        media_settings.enable()
+        self.addCleanup(media_settings.disable)
+        self.author = make_user('author')
+        self.recipe = make_recipe(self.author, 'soup',
+                                  image=self.save_image('recipe.png'))
+        self.client = APIClient()
+
+    def save_image(self, name, color='red', image_format='PNG'):
+        buffer = io.BytesIO()
+        Image.new('RGB', (800, 600), color).save(buffer, image_format)
+        return default_storage.save(name, ContentFile(buffer.getvalue()))
+
+    def read_color(self, name):
+        with default_storage.open(name) as file:
+            return Image.open(file).convert('RGB').getpixel((0, 0))
+
+    def get_feed_recipe(self):
+        return self.client.get('/api/recipes/').json()['results'][0]
+
+    @mock.patch('recipes.images.schedule_file_deletion')
+    def test_feed_shows_processed_image(self, schedule_file_deletion):
+        before = self.get_feed_recipe()
+        self.assertTrue(before['image'].endswith('/recipe.png'))
+        self.assertIsNone(before['thumbnails'])
+        process_recipe_image(self.recipe.pk)
+        after = self.get_feed_recipe()
+        self.assertTrue(after['image'].endswith('/recipe.jpg'))
+        self.assertEqual(set(after['thumbnails']), {'small', 'medium'})
+        schedule_file_deletion.assert_called_once_with('recipe.png')
+
+    @override_settings(RECIPE_IMAGE_DELETE_DELAY=60)
+    def test_original_kept_until_delay(self):
+        with mock.patch('recipes.images.threading.Timer') as timer:
+            process_recipe_image(self.recipe.pk)
+        self.assertTrue(default_storage.exists('recipe.png'))
+        self.assertTrue(default_storage.exists('recipe.jpg'))
+        timer.assert_called_once()
+        self.assertEqual(timer.call_args.args[0], 60)
+        timer.return_value.start.assert_called_once()
+
+    @mock.patch('recipes.images.threading.Timer')
+    def test_same_stem_does_not_overwrite(self, timer):
+        other = make_recipe(self.author, 'salad', image=self.save_image(
+            'recipe.jpg', color='blue', image_format='JPEG'))
+        process_recipe_image(self.recipe.pk)
+        process_recipe_image(other.pk)
+        self.recipe.refresh_from_db()
+        other.refresh_from_db()
+        self.assertNotEqual(self.recipe.image.name, other.image.name)
+        first = get_thumbnail_names(self.recipe.image.name)
+        second = get_thumbnail_names(other.image.name)
+        self.assertFalse(set(first) & set(second))
+        for name in [self.recipe.image.name, *first]:
+            self.assertGreater(self.read_color(name)[0], 200)
+        for name in [other.image.name, *second]:
+            self.assertGreater(self.read_color(name)[2], 200)
+
+    @override_settings(RECIPE_IMAGE_DELETE_DELAY=0)
+    @mock.patch('recipes.images.threading.Timer')
+    def test_lost_timer_cleaned_by_command(self, timer):
+        # Таймер не сработал: процесс завершился раньше.
+        process_recipe_image(self.recipe.pk)
+        self.assertTrue(PendingFileDeletion.objects.exists())
+        self.assertTrue(default_storage.exists('recipe.png'))
+        out = io.StringIO()
+        call_command('process_images', stdout=out)
+        self.assertIn('deleted 1 old files', out.getvalue())
+        self.assertFalse(default_storage.exists('recipe.png'))
+        self.assertFalse(PendingFileDeletion.objects.exists())
@@ -0,0 +1,29 @@
+from unittest import mock
+
+from django.conf import settings
+from django.test import TestCase, override_settings
+
+from recipes.jobs import schedule_job
+
+
+class ScheduleJobTest(TestCase):
+    """ Задачи запускаются только после коммита. """
+
+    def test_tests_run_jobs_synchronously(self):
+        self.assertFalse(settings.BACKGROUND_JOBS_ASYNC)
+
+    def test_sync_job_runs_after_commit(self):
+        job = mock.Mock(__name__='job')
+        with self.captureOnCommitCallbacks(execute=True):
+            schedule_job(job, 1, 2)
+            job.assert_not_called()
+        job.assert_called_once_with(1, 2)
+
+    @override_settings(BACKGROUND_JOBS_ASYNC=True)
+    def test_async_job_submitted_to_executor(self):
+        job = mock.Mock(__name__='job')
+        with mock.patch('recipes.jobs.get_executor') as get_executor:
+            with self.captureOnCommitCallbacks(execute=True):
+                schedule_job(job, 1)
+        get_executor.return_value.submit.assert_called_once()
+        job.assert_not_called()
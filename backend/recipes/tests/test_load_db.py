@@ -0,0 +1,36 @@
+import tempfile
+from io import StringIO
+from pathlib import Path
+from unittest import mock
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from recipes.models import Ingredient
+
+from .base import make_ingredient
+
+
+class LoadDbTest(TestCase):
+
+    def load(self, rows):
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / 'ingredients.csv'
+            path.write_text(rows, encoding='utf-8')
+            out = StringIO()
+            call_command('load_db', str(path), stdout=out)
+        return out.getvalue()
+
+    def test_counts_only_new_rows(self):
+        make_ingredient('соль', 'г')
+        output = self.load('соль,г\nсахар,г\nсахар,г\n')
+        self.assertIn('1 new of 3 rows', output)
+
+    def test_conflicting_rows_are_not_counted(self):
+        # Строка появилась после чтения существующих ингредиентов.
+        make_ingredient('соль', 'г')
+        with mock.patch.object(Ingredient.objects, 'values_list',
+                               return_value=[]):
+            output = self.load('соль,г\nсахар,г\n')
+        self.assertIn('1 new of 2 rows', output)
+        self.assertEqual(Ingredient.objects.count(), 2)
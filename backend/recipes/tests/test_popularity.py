@@ -0,0 +1,52 @@
+from datetime import timedelta
+
+from django.test import TestCase
+from django.utils import timezone
+
+from recipes.models import Favorite, RecipePopularity
+from recipes.popularity import decay, refresh_popularity
+
+from .base import make_recipe, make_user
+
+
+class RefreshPopularityTests(TestCase):
+
+    def setUp(self):
+        self.author = make_user('author')
+        self.recipe = make_recipe(self.author, 'soup')
+        self.now = timezone.now()
+
+    def favorite(self, name, created):
+        favorite = Favorite.objects.create(user=make_user(name),
+                                           recipe=self.recipe)
+        Favorite.objects.filter(pk=favorite.pk).update(created=created)
+
+    def score(self):
+        return RecipePopularity.objects.get(recipe=self.recipe).score
+
+    def test_event_committed_after_refresh_is_counted(self):
+        refresh_popularity(self.now)
+        # Транзакция началась до пересчета, а закоммитилась после него.
+        self.favorite('late', self.now - timedelta(seconds=10))
+        later = self.now + timedelta(seconds=60)
+        refresh_popularity(later)
+        self.assertAlmostEqual(self.score(), decay(70))
+
+    def test_event_in_overlap_is_counted_once(self):
+        self.favorite('fan', self.now - timedelta(seconds=10))
+        refresh_popularity(self.now)
+        refresh_popularity(self.now + timedelta(seconds=60))
+        refresh_popularity(self.now + timedelta(seconds=120))
+        self.assertAlmostEqual(self.score(), decay(130))
+
+    def test_old_history_is_not_rescanned(self):
+        self.favorite('old', self.now - timedelta(days=60))
+        self.favorite('legacy', self.now - timedelta(days=365 * 20))
+        self.assertEqual(refresh_popularity(self.now), 0)
+        self.assertFalse(RecipePopularity.objects.exists())
+
+    def test_pruned_scores_are_not_rescanned(self):
+        self.favorite('fan', self.now - timedelta(hours=1))
+        refresh_popularity(self.now)
+        refresh_popularity(self.now + timedelta(days=60))
+        self.assertFalse(RecipePopularity.objects.exists())
@@ -0,0 +1,53 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from recipes.models import Favorite, ShopList
+from recipes.views import RecipeView
+from .base import make_ingredient, make_recipe, make_tag, make_user
+
+LIST_QUERIES = 4
+DETAIL_QUERIES = 3
+
+
+@override_settings(RECIPE_FEED_CACHE=False)
+class RecipeQueryCountTest(TestCase):
+    """ Число запросов не зависит от размера страницы и сериализатора. """
+
+    def setUp(self):
+        self.user = make_user('reader')
+        tags = [make_tag(slug) for slug in ('breakfast', 'lunch', 'dinner')]
+        ingredients = [make_ingredient(f'ingredient{number}')
+                       for number in range(4)]
+        authors = [make_user(f'author{number}') for number in range(3)]
+        self.recipes = [
+            make_recipe(authors[number % 3], f'recipe{number}',
+                        tags=tags[:number % 3 + 1],
+                        ingredients=[(ingredient, 2) for ingredient
+                                     in ingredients[:number % 4 + 1]])
+            for number in range(12)]
+        Favorite.objects.create(user=self.user, recipe=self.recipes[0])
+        ShopList.objects.create(user=self.user, recipe=self.recipes[1])
+
+    def assert_queries(self, path, count):
+        for user in (None, self.user):
+            for fast in (True, False):
+                with self.subTest(path=path, user=user, fast=fast):
+                    cache.clear()
+                    client = APIClient()
+                    client.force_authenticate(user)
+                    with mock.patch.object(RecipeView, 'fast_serialization',
+                                           fast):
+                        with self.assertNumQueries(count):
+                            response = client.get(path)
+                    self.assertEqual(response.status_code, 200)
+
+    def test_list(self):
+        for limit in (1, 6, 12):
+            self.assert_queries(f'/api/recipes/?limit={limit}', LIST_QUERIES)
+
+    def test_detail(self):
+        for recipe in self.recipes[:3]:
+            self.assert_queries(f'/api/recipes/{recipe.pk}/', DETAIL_QUERIES)
@@ -0,0 +1,36 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from .base import make_ingredient
+
+
+class ReferenceCacheTest(TestCase):
+    """ Кэш справочников: срок хранения и ETag по формату ответа. """
+
+    def setUp(self):
+        cache.clear()
+        make_ingredient('соль')
+        self.client = APIClient()
+
+    @override_settings(REFERENCE_CACHE_TIMEOUT=60)
+    def test_search_terms_expire(self):
+        with mock.patch('recipes.mixins.cache.set') as cache_set:
+            self.client.get('/api/ingredients/?name=со')
+        cache_set.assert_called_once()
+        self.assertEqual(cache_set.call_args.args[2], 60)
+
+    def test_etag_depends_on_format(self):
+        response = self.client.get('/api/ingredients/')
+        etag = response['ETag']
+        self.assertIn('Accept', response['Vary'])
+        self.assertEqual(self.client.get(
+            '/api/ingredients/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        response = self.client.get(
+            '/api/ingredients/', HTTP_ACCEPT='text/html',
+            HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertIn(b'<html', response.content)
@@ -0,0 +1,83 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+
+from recipes.cache import invalidate_recipe_feed, invalidate_reference
+from recipes.models import Ingredient, RecipeSearchDocument
+from recipes.search import (IngredientPrefixIndex, RecipeInvertedIndex,
+                            search_ingredients)
+
+from .base import make_ingredient, make_recipe, make_user
+
+
+class IngredientPrefixIndexTest(TestCase):
+    """ Индекс следует за версией справочника в общем кэше. """
+
+    def setUp(self):
+        cache.clear()
+        self.index = IngredientPrefixIndex()
+        self.salt = make_ingredient('соль')
+
+    def test_reloads_after_change_in_other_process(self):
+        self.assertEqual(self.index.search('со'), [self.salt.pk])
+        # Другой процесс меняет справочник: сигналы здесь не приходят,
+        # меняется только версия в общем кэше.
+        Ingredient.objects.filter(pk=self.salt.pk).update(name='сахар')
+        invalidate_reference('ingredients')
+        self.assertEqual(self.index.search('со'), [])
+        self.assertEqual(self.index.search('са'), [self.salt.pk])
+
+    def test_new_ingredient_found_after_commit(self):
+        self.index.search('со')
+        with self.captureOnCommitCallbacks(execute=True):
+            soda = make_ingredient('сода')
+        self.assertEqual(self.index.search('со'), [soda.pk, self.salt.pk])
+
+
+class PostgresIngredientSearchTest(TestCase):
+    """ Ветка PostgreSQL: сначала начало названия, затем вхождение. """
+
+    def setUp(self):
+        self.names = ['pepper', 'salt', 'sea salt', 'salted butter',
+                      'rock salt']
+        for name in self.names:
+            make_ingredient(name)
+        patcher = mock.patch.object(connection, 'vendor', 'postgresql')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def search(self, term, limit=None):
+        return [ingredient.name for ingredient in search_ingredients(
+            Ingredient.objects.all(), term, limit)]
+
+    def test_prefix_matches_first(self):
+        self.assertEqual(self.search('salt'), [
+            'salt', 'salted butter', 'rock salt', 'sea salt'])
+
+    def test_limit(self):
+        self.assertEqual(self.search('salt', 1), ['salt'])
+        self.assertEqual(self.search('salt', 3), [
+            'salt', 'salted butter', 'rock salt'])
+        self.assertEqual(self.search('alt', 2), ['rock salt', 'salt'])
+
+
+class RecipeInvertedIndexTest(TestCase):
+    """ Индекс следует за версией ленты рецептов в общем кэше. """
+
+    def setUp(self):
+        cache.clear()
+        self.index = RecipeInvertedIndex()
+        author = make_user('author')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.recipe = make_recipe(author, 'borscht')
+
+    def test_reloads_after_change_in_other_process(self):
+        self.assertEqual(self.index.search('borscht'), [self.recipe.pk])
+        # Документ изменен другим процессом, он же сменил версию ленты.
+        RecipeSearchDocument.objects.filter(recipe=self.recipe).update(
+            title='solyanka', body='')
+        invalidate_recipe_feed()
+        self.assertEqual(self.index.search('borscht'), [])
+        self.assertEqual(self.index.search('solyanka'), [self.recipe.pk])
@@ -0,0 +1,99 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from recipes.models import (Favorite, Follow, RecipePopularity, ShopList)
+from recipes.views import RecipeView
+from .base import make_ingredient, make_recipe, make_tag, make_user
+
+
+@override_settings(RECIPE_FEED_CACHE=False, BACKGROUND_JOBS_ASYNC=False)
+class RecipeValuesSerializerParityTest(TestCase):
+    """ Ответы через .values() совпадают побайтно с RecipeSerializer. """
+
+    def setUp(self):
+        cache.clear()
+        self.author = make_user('author')
+        self.other = make_user('other')
+        self.user = make_user('reader')
+        tags = [make_tag(slug) for slug in ('breakfast', 'lunch', 'dinner')]
+        ingredients = [make_ingredient(f'ingredient{number}')
+                       for number in range(4)]
+        self.recipes = [
+            make_recipe(self.author, 'first', tags=tags[:2],
+                        ingredients=[(ingredients[2], 5),
+                                     (ingredients[0], 1)],
+                        image_processed=True),
+            make_recipe(self.other, 'second', tags=tags[1:],
+                        ingredients=[(ingredients[3], 2)]),
+            make_recipe(self.author, 'third', image_processed=True),
+            make_recipe(self.other, 'fourth', tags=tags[:1],
+                        ingredients=[(ingredient, 3)
+                                     for ingredient in ingredients]),
+        ]
+        Favorite.objects.create(user=self.user, recipe=self.recipes[0])
+        ShopList.objects.create(user=self.user, recipe=self.recipes[1])
+        with self.captureOnCommitCallbacks(execute=True):
+            Follow.objects.create(user=self.user, following=self.author)
+        for score, recipe in enumerate(self.recipes):
+            RecipePopularity.objects.create(
+                recipe=recipe, score=score, updated_at=timezone.now())
+
+    def get(self, path, user, fast):
+        client = APIClient()
+        if user is not None:
+            client.force_authenticate(user)
+        with mock.patch.object(RecipeView, 'fast_serialization', fast):
+            response = client.get(path)
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.content
+
+    def assert_parity(self, path, users=(None,)):
+        for user in users:
+            with self.subTest(path=path, user=user):
+                self.assertEqual(self.get(path, user, fast=True),
+                                 self.get(path, user, fast=False))
+
+    def test_list(self):
+        users = (None, self.user, self.author)
+        self.assert_parity('/api/recipes/', users)
+        self.assert_parity('/api/recipes/?limit=2&page=2', users)
+        self.assert_parity('/api/recipes/?pagination=cursor&limit=3', users)
+        self.assert_parity('/api/recipes/?tags=lunch', users)
+        self.assert_parity('/api/recipes/?is_favorited=1', (self.user,))
+        self.assert_parity('/api/recipes/?is_in_shopping_cart=1',
+                           (self.user,))
+
+    def test_retrieve(self):
+        for recipe in self.recipes:
+            self.assert_parity(f'/api/recipes/{recipe.pk}/',
+                               (None, self.user))
+
+    def test_trending(self):
+        self.assert_parity('/api/recipes/trending/', (None, self.user))
+
+    def test_feed(self):
+        content = self.get('/api/recipes/feed/', self.user, fast=True)
+        self.assertIn(b'"name":"third"', content)
+        self.assert_parity('/api/recipes/feed/', (self.user,))
+
+    def test_flags_and_nested_fields(self):
+        recipe = next(
+            item for item in APIClient().get('/api/recipes/').json()[
+                'results'] if item['id'] == self.recipes[0].pk)
+        self.assertEqual([tag['slug'] for tag in recipe['tags']],
+                         ['breakfast', 'lunch'])
+        self.assertEqual(
+            [(item['name'], item['amount'])
+             for item in recipe['ingredients']],
+            [('ingredient2', 5), ('ingredient0', 1)])
+        self.assertEqual(set(recipe['thumbnails']), {'small', 'medium'})
+        client = APIClient()
+        client.force_authenticate(self.user)
+        recipe = client.get(f'/api/recipes/{self.recipes[0].pk}/').json()
+        self.assertTrue(recipe['is_favorited'])
+        self.assertFalse(recipe['is_in_shopping_cart'])
+        self.assertTrue(recipe['author']['is_subscribed'])
@@ -1,7 +1,15 @@
-from django.urls import include, path
+from django.conf import settings
+from django.urls import URLPattern, include, path
 from rest_framework.routers import DefaultRouter
 
-from .views import CustomUserViewSet, IngredientView, RecipeView, TagView
+from .views import (CustomUserViewSet, IngredientView, RecipeView, TagView,
+                    async_read_view)
+
+ASYNC_VIEW_NAMES = {
+    'tags-list', 'tags-detail',
+    'ingredients-list', 'ingredients-detail',
+    'resipes-list', 'resipes-detail', 'resipes-feed',
+}
 
 router = DefaultRouter()
 router.register('users', CustomUserViewSet, basename='users')
@@ -9,6 +17,18 @@ router.register('tags', TagView, basename='tags')
 router.register('ingredients', IngredientView, basename='ingredients')
 router.register('recipes', RecipeView, basename='resipes')
 
+
+def get_router_urls():
+    if not settings.ASYNC_READ_VIEWS:
+        return router.urls
+    return [
+        URLPattern(url.pattern, async_read_view(url.callback),
+                   url.default_args, url.name)
+        if url.name in ASYNC_VIEW_NAMES else url
+        for url in router.urls
+    ]
+
+
 urlpatterns = [
-    path('', include(router.urls)),
+    path('', include(get_router_urls())),
 ]
@@ -1,19 +1,30 @@
+from django.db import transaction
 from rest_framework import status
 from rest_framework.generics import get_object_or_404
 from rest_framework.response import Response
 
+from users.models import CustomUser
+from .cache import invalidate_shopping_list, invalidate_user_state
+from .cart import add_to_cart_totals
+from .counters import change_recipe_counter
 from .serializers import RecipeFollowSerializer
-from .models import Recipe
+from .models import Recipe, ShopList
+
+
+def recipes_added(model, user_id, recipe_ids):
+    """ Счетчики рецептов и суммы списка покупок после bulk_create,
+        который не отправляет сигналы. """
+    change_recipe_counter(model, recipe_ids, 1)
+    if model is ShopList:
+        add_to_cart_totals(user_id, recipe_ids)
 
 
 def remov_obj(model, user, pk):
-    recipe = get_object_or_404(Recipe, id=pk)
-    if not model.objects.filter(user=user, recipe=recipe).exists():
-        return Response('Рецепт отсутствует в избранном',
-                        status=status.HTTP_400_BAD_REQUEST)
-    obj = model.objects.get(user=user, recipe__id=pk)
-    obj.delete()
-    return Response(status=status.HTTP_204_NO_CONTENT)
+    if bulk_remov_obj(model, user, [pk]):
+        return Response(status=status.HTTP_204_NO_CONTENT)
+    get_object_or_404(Recipe, id=pk)
+    return Response('Рецепт отсутствует в избранном',
+                    status=status.HTTP_400_BAD_REQUEST)
 
 
 def add_obj(model, user, pk):
@@ -21,6 +32,60 @@ def add_obj(model, user, pk):
     if model.objects.filter(user=user, recipe=recipe).exists():
         return Response('Рецепт добавлен в список',
                         status=status.HTTP_400_BAD_REQUEST)
-    obj = model.objects.create(user=user, recipe=recipe)
+    # Сигналы меняют счетчики и суммы в той же транзакции.
+    with transaction.atomic():
+        obj = model.objects.create(user=user, recipe=recipe)
     serializer = RecipeFollowSerializer(obj.recipe)
     return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+
+def lock_user(user):
+    """ Массовые операции одного пользователя выполняются по очереди:
+        повтор запроса не применит изменения счетчиков второй раз. """
+    CustomUser.objects.select_for_update().filter(pk=user.pk).exists()
+
+
+def objects_changed(model, user_id):
+    """ Массовые операции не отправляют сигналы,
+        поэтому кэши пользователя сбрасываются явно. """
+    if model is ShopList:
+        transaction.on_commit(lambda: invalidate_shopping_list(user_id))
+    transaction.on_commit(lambda: invalidate_user_state(user_id))
+
+
+@transaction.atomic
+def bulk_add_obj(model, user, recipe_ids):
+    """ Добавляет рецепты одним INSERT, несуществующие и уже
+        добавленные рецепты пропускаются. Возвращает добавленные id. """
+    lock_user(user)
+    recipe_ids = set(Recipe.objects.filter(
+        pk__in=recipe_ids).values_list('pk', flat=True))
+    added = recipe_ids - set(model.objects.filter(
+        user=user, recipe_id__in=recipe_ids
+    ).values_list('recipe_id', flat=True))
+    if added:
+        model.objects.bulk_create(
+            [model(user=user, recipe_id=pk) for pk in added],
+            ignore_conflicts=True)
+        recipes_added(model, user.pk, added)
+        objects_changed(model, user.pk)
+    return sorted(added)
+
+
+@transaction.atomic
+def bulk_remov_obj(model, user, recipe_ids=None):
+    """ Удаляет рецепты пользователя, без recipe_ids удаляются все.
+        Возвращает удаленные id. """
+    lock_user(user)
+    queryset = model.objects.filter(user=user)
+    if recipe_ids is not None:
+        queryset = queryset.filter(recipe_id__in=recipe_ids)
+    # Строки блокируются, чтобы параллельное удаление
+    # не уменьшило счетчики дважды.
+    locked = dict(queryset.select_for_update().values_list(
+        'pk', 'recipe_id'))
+    if locked:
+        # Сигналы удаления меняют счетчики, суммы списка покупок
+        # и сбрасывают кэши пользователя.
+        model.objects.filter(pk__in=list(locked)).delete()
+    return sorted(locked.values())
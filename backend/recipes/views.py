@@ -1,28 +1,45 @@
-import datetime
-from django.http.response import HttpResponse
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DatabaseError
+from django.http.response import HttpResponse, StreamingHttpResponse
 from djoser.views import UserViewSet
 from rest_framework import status, viewsets
 from rest_framework.decorators import action
 from rest_framework.generics import get_object_or_404
-from rest_framework.permissions import (IsAuthenticated,
+from rest_framework.permissions import (SAFE_METHODS, IsAuthenticated,
                                         IsAuthenticatedOrReadOnly)
 from rest_framework.response import Response
 
 
+from config.db import close_old_connections
 from users.models import CustomUser
 from users.serializers import CustomUserSerializer
-from .pagination import LimitPageNumberPagination
+from .cache import cache_stream, get_shopping_list_key
+from .cart import get_cart_totals
+from .exporters import get_exporter_classes
+from .feed import get_feed_ids
+from .pagination import (CursorPaginationMixin, FeedPagination,
+                         LimitPageNumberPagination)
 from .filters import IngredientSearchFilter, RecipeFilter
-from .models import (Favorite, Follow, Ingredient, Recipe,
-                     ShopList, Tag, RecipeIngredient)
+from .mixins import (RecipeFeedCacheMixin, ReferenceCacheMixin,
+                     ReplicaReadMixin)
+from .models import Favorite, Follow, Ingredient, Recipe, ShopList, Tag
 from .serializers import (FollowSerializer, FollowCreateSerializer,
-                          IngredientSerializer,
+                          RecipeIdsSerializer,
+                          IngredientSerializer, get_recipes_limit,
                           RecipesCreateSerializer, RecipeSerializer,
-                          TagSerializer)
-from .utils import remov_obj, add_obj
+                          RecipeValuesSerializer, TagSerializer)
+from .utils import add_obj, bulk_add_obj, bulk_remov_obj, remov_obj
+
+logger = logging.getLogger(__name__)
 
 
-class CustomUserViewSet(UserViewSet):
+class CustomUserViewSet(CursorPaginationMixin, UserViewSet):
     """ Вьюсет для модели пользователя с дополнительным операциями
         через GET запросы. """
     queryset = CustomUser.objects.all()
@@ -60,48 +77,149 @@ class CustomUserViewSet(UserViewSet):
     @action(methods=['get'], detail=False, url_path='subscriptions',
             permission_classes=[IsAuthenticated])
     def user_subscriptions(self, request):
-        user = request.user
-        queryset = Follow.objects.filter(user=user)
+        queryset = Follow.objects.filter(
+            user=request.user
+        ).select_related('following').order_by('-id')
         pages = self.paginate_queryset(queryset)
+        recipes_by_author = Recipe.objects.latest_by_author(
+            [follow.following_id for follow in pages],
+            get_recipes_limit(request))
         serializer = FollowSerializer(
             pages,
             many=True,
-            context={'request': request}
+            context={'request': request,
+                     'recipes_by_author': recipes_by_author}
         )
         return self.get_paginated_response(serializer.data)
 
 
-class TagView(viewsets.ReadOnlyModelViewSet):
+class TagView(ReferenceCacheMixin, viewsets.ReadOnlyModelViewSet):
+    cache_name = 'tags'
     serializer_class = TagSerializer
     queryset = Tag.objects.all()
     permission_classes = (IsAuthenticatedOrReadOnly,)
     pagination_class = None
 
 
-class IngredientView(viewsets.ReadOnlyModelViewSet):
+class IngredientView(ReplicaReadMixin, ReferenceCacheMixin,
+                     viewsets.ReadOnlyModelViewSet):
+    cache_name = 'ingredients'
     serializer_class = IngredientSerializer
     permission_classes = (IsAuthenticatedOrReadOnly,)
     queryset = Ingredient.objects.all()
     filter_backends = (IngredientSearchFilter,)
-    search_fields = ('^name',)
     pagination_class = None
 
 
-class RecipeView(viewsets.ModelViewSet):
+def warm_up_reference_cache():
+    """ Заполняет кэш справочников при старте процесса. """
+    try:
+        for view in (TagView, IngredientView):
+            view.warm_up_cache()
+    except DatabaseError:
+        logger.warning('Reference cache warm-up skipped', exc_info=True)
+
+
+read_executor = ThreadPoolExecutor(
+    max_workers=settings.ASYNC_READ_THREADS, thread_name_prefix='read-view')
+
+
+def call_read_view(view, request, *args, **kwargs):
+    # Потоки пула не получают сигналы request_started/finished,
+    # поэтому соединения с базой проверяются здесь.
+    close_old_connections()
+    try:
+        response = view(request, *args, **kwargs)
+        if callable(getattr(response, 'render', None)):
+            response.render()
+        return response
+    finally:
+        close_old_connections()
+
+
+def async_read_view(view):
+    """ Асинхронная обертка view для ASGI. GET и HEAD выполняются
+        в пуле read_executor и не ждут общий поток синхронного кода,
+        изменяющие запросы идут через него, как в обычном режиме. """
+
+    async def async_view(request, *args, **kwargs):
+        if request.method in SAFE_METHODS:
+            return await sync_to_async(
+                call_read_view, thread_sensitive=False,
+                executor=read_executor)(view, request, *args, **kwargs)
+        return await sync_to_async(view)(request, *args, **kwargs)
+
+    return wraps(view)(async_view)
+
+
+class RecipeView(ReplicaReadMixin, RecipeFeedCacheMixin,
+                 CursorPaginationMixin, viewsets.ModelViewSet):
     serializer_class = RecipeSerializer
     permission_classes = (IsAuthenticatedOrReadOnly,)
     queryset = Recipe.objects.all()
     filterset_class = RecipeFilter
     pagination_class = LimitPageNumberPagination
+    # None - по настройке FAST_RECIPE_SERIALIZATION.
+    fast_serialization = None
+    fast_serialization_actions = ('list', 'retrieve', 'trending', 'feed')
+
+    # Списки покупок кэшируются по версии, которая меняется после
+    # коммита в основной базе, и сразу читаются после изменения корзины.
+    primary_actions = ('shopping_cart_summary', 'download_cart_recipe')
+
+    def use_fast_serialization(self):
+        enabled = self.fast_serialization
+        if enabled is None:
+            enabled = settings.FAST_RECIPE_SERIALIZATION
+        return (enabled and self.request.method == 'GET'
+                and self.action in self.fast_serialization_actions)
+
+    def get_queryset(self):
+        queryset = Recipe.objects.with_user_flags(self.get_flags_user())
+        if self.use_fast_serialization():
+            return queryset.values(*RecipeValuesSerializer.values_fields)
+        return queryset.with_related()
+
+    def use_cursor_pagination(self):
+        # Курсор работает только с порядком по -id.
+        params = self.request.query_params
+        return (super().use_cursor_pagination()
+                and self.action == 'list'
+                and params.get('ordering') != 'popular'
+                and not params.get('search', '').strip())
 
     def get_serializer_class(self):
         if self.request.method in ('POST', 'PUT', 'PATCH'):
             return RecipesCreateSerializer
+        if self.use_fast_serialization():
+            return RecipeValuesSerializer
         return RecipeSerializer
 
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
 
+    @action(detail=False, url_path='trending', methods=['GET'])
+    def trending(self, request):
+        """ Рецепты по убыванию предрассчитанной популярности. """
+        queryset = self.filter_queryset(self.get_queryset()).filter(
+            popularity__isnull=False
+        ).order_by('-popularity__score', '-id')
+        page = self.paginate_queryset(queryset)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+    @action(detail=False, url_path='feed', methods=['GET'],
+            permission_classes=[IsAuthenticated])
+    def feed(self, request):
+        """ Новые рецепты авторов, на которых подписан пользователь. """
+        paginator = FeedPagination()
+        recipe_ids = paginator.paginate_ids(
+            request, lambda before, limit: get_feed_ids(
+                request.user.id, before, limit))
+        queryset = self.get_queryset().filter(id__in=recipe_ids)
+        serializer = self.get_serializer(queryset, many=True)
+        return paginator.get_paginated_response(serializer.data)
+
     @action(detail=True, url_path='favorite', methods=['POST'],
             permission_classes=[IsAuthenticated])
     def recipe_id_favorite(self, request, pk):
@@ -130,31 +248,72 @@ class RecipeView(viewsets.ModelViewSet):
         model = ShopList
         return remov_obj(model=model, user=user, pk=pk)
 
+    def bulk_change(self, request, model):
+        """ Массовое добавление (POST) или удаление (DELETE)
+            рецептов из тела {"recipes": [id, ...]}. """
+        serializer = RecipeIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        recipe_ids = serializer.validated_data['recipes']
+        if request.method == 'POST':
+            return Response(
+                {'recipes': bulk_add_obj(model, request.user, recipe_ids)},
+                status=status.HTTP_201_CREATED)
+        return Response(
+            {'recipes': bulk_remov_obj(model, request.user, recipe_ids)})
+
+    @action(detail=False, url_path='favorite', url_name='favorite-bulk',
+            methods=['POST', 'DELETE'],
+            permission_classes=[IsAuthenticated])
+    def favorite_bulk(self, request):
+        return self.bulk_change(request, Favorite)
+
+    @action(detail=False, url_path='shopping_cart',
+            url_name='shopping-cart-bulk', methods=['POST', 'DELETE'],
+            permission_classes=[IsAuthenticated])
+    def shopping_cart_bulk(self, request):
+        return self.bulk_change(request, ShopList)
+
+    @action(detail=False, url_path='shopping_cart/clear',
+            methods=['DELETE'], permission_classes=[IsAuthenticated])
+    def shopping_cart_clear(self, request):
+        """ Очистка списка покупок одним запросом. """
+        bulk_remov_obj(ShopList, request.user)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+    @action(detail=False, url_path='shopping_cart/summary',
+            methods=['GET'], permission_classes=[IsAuthenticated])
+    def shopping_cart_summary(self, request):
+        """ Суммы ингредиентов списка покупок. """
+        return Response([
+            {'id': item['ingredient_id'],
+             'name': item['ingredient__name'],
+             'measurement_unit': item['ingredient__measurement_unit'],
+             'amount': item['amount']}
+            for item in get_cart_totals(request.user)
+        ])
+
     @action(detail=False,
             url_path='download_shopping_cart',
-            methods=['GET'])
+            methods=['GET'],
+            permission_classes=[IsAuthenticated],
+            renderer_classes=get_exporter_classes())
     def download_cart_recipe(self, request):
-        """ Метод скачивания списка продуктов. """
-        shopping_list = {}
-        ingredients = RecipeIngredient.objects.filter(
-            recipe__cart_recipe__user=request.user
-        )
-        for ingredient in ingredients:
-            amount = ingredient.amount
-            name = ingredient.ingredient.name
-            measurement_unit = ingredient.ingredient.measurement_unit
-            if name not in shopping_list:
-                shopping_list[name] = {
-                    'measurement_unit': measurement_unit,
-                    'amount': amount
-                }
-            else:
-                shopping_list[name]['amount'] += amount
-        main_list = ([f"* {item}:{value['amount']}"
-                      f"{value['measurement_unit']}\n"
-                      for item, value in shopping_list.items()])
-        today = datetime.date.today()
-        main_list.append(f'\n Enjoy your meal, {today.year}')
-        response = HttpResponse(main_list, 'Content-Type: text/plain')
-        response['Content-Disposition'] = 'attachment; filename="BuyList.txt"'
+        """ Метод скачивания списка продуктов.
+            Формат выбирается параметром ?format=txt|csv|pdf
+            или заголовком Accept. """
+        exporter = request.accepted_renderer
+        key = get_shopping_list_key(request.user.id, exporter.format)
+        content = cache.get(key)
+        if content is None:
+            # Суммы читаются здесь: под ASGI тело ответа отдается
+            # из event loop, где запросы к базе запрещены.
+            response = StreamingHttpResponse(
+                cache_stream(key, exporter.iter_render(
+                    list(get_cart_totals(request.user)))),
+                content_type=exporter.content_type)
+        else:
+            response = HttpResponse(
+                content, content_type=exporter.content_type)
+        response['Content-Disposition'] = (
+            f'attachment; filename="{exporter.get_filename()}"')
         return response
@@ -0,0 +1,161 @@
+import hashlib
+import hmac
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from rest_framework.authentication import (BasicAuthentication,
+                                           TokenAuthentication)
+from rest_framework.authtoken.models import Token
+
+from recipes.cache import bump_version, get_version
+
+AUTH_GENERATION_KEY = 'auth_generation:{name}:{digest}'
+AUTH_ENTRY_KEY = 'auth:{name}:{digest}'
+
+
+def get_digest(value):
+    """ HMAC учетных данных, сами токены и пароли в кэш не попадают. """
+    return hmac.new(settings.SECRET_KEY.encode('utf-8'),
+                    value.encode('utf-8'), hashlib.sha256).hexdigest()
+
+
+class AuthCache:
+    """ Кэш аутентификации в два уровня: LRU в памяти процесса
+        с коротким TTL и общий кэш. Запись в общем кэше действительна,
+        пока не сменилось поколение ее учетных данных: токена или
+        логина. Поколение читается до запроса к базе, поэтому выход
+        или смена пароля во время проверки не попадут в кэш. """
+
+    def __init__(self, name):
+        self.name = name
+        self.local = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get_generation_key(self, digest):
+        return AUTH_GENERATION_KEY.format(name=self.name, digest=digest)
+
+    # Поколения создаются и для неверных учетных данных, поэтому
+    # живут не дольше записей: истекшее поколение дает только промах.
+    def get_generation(self, digest):
+        return get_version(self.get_generation_key(digest),
+                           settings.AUTH_CACHE_TIMEOUT)
+
+    def invalidate(self, digest):
+        bump_version(self.get_generation_key(digest),
+                     settings.AUTH_CACHE_TIMEOUT)
+
+    def get(self, digest, generation_digest):
+        payload = self.get_local(digest)
+        if payload is None:
+            entry_key = AUTH_ENTRY_KEY.format(name=self.name, digest=digest)
+            generation_key = self.get_generation_key(generation_digest)
+            values = cache.get_many([entry_key, generation_key])
+            entry = values.get(entry_key)
+            if entry is None:
+                return None
+            user_id, generation, payload = entry
+            if generation != values.get(generation_key):
+                return None
+            self.set_local(digest, user_id, payload)
+        # Каждый запрос получает свою копию объектов.
+        return pickle.loads(payload)
+
+    def set(self, digest, user_id, value, generation):
+        """ generation - поколение, прочитанное до проверки в базе. """
+        payload = pickle.dumps(value)
+        cache.set(AUTH_ENTRY_KEY.format(name=self.name, digest=digest),
+                  (user_id, generation, payload),
+                  settings.AUTH_CACHE_TIMEOUT)
+        self.set_local(digest, user_id, payload)
+
+    def get_local(self, digest):
+        with self.lock:
+            entry = self.local.get(digest)
+            if entry is None:
+                return None
+            user_id, payload, expires = entry
+            if expires < time.monotonic():
+                del self.local[digest]
+                return None
+            self.local.move_to_end(digest)
+            return payload
+
+    def set_local(self, digest, user_id, payload):
+        if not settings.AUTH_LOCAL_CACHE_TIMEOUT:
+            return
+        expires = time.monotonic() + settings.AUTH_LOCAL_CACHE_TIMEOUT
+        with self.lock:
+            self.local[digest] = (user_id, payload, expires)
+            self.local.move_to_end(digest)
+            while len(self.local) > settings.AUTH_LOCAL_CACHE_SIZE:
+                self.local.popitem(last=False)
+
+    def forget_user(self, user_id):
+        with self.lock:
+            for digest in [digest for digest, entry in self.local.items()
+                           if entry[0] == user_id]:
+                del self.local[digest]
+
+
+token_cache = AuthCache('token')
+basic_cache = AuthCache('basic')
+
+
+def invalidate_token_auth(key, user_id):
+    """ Сбрасывает кэш токена после коммита. В других процессах
+        локальные записи живут не дольше AUTH_LOCAL_CACHE_TIMEOUT. """
+
+    def invalidate():
+        token_cache.invalidate(get_digest(key))
+        token_cache.forget_user(user_id)
+
+    transaction.on_commit(invalidate)
+
+
+def invalidate_user_auth(user_id, logins):
+    """ Сбрасывает кэш токена пользователя и Basic по его логинам. """
+
+    def invalidate():
+        for key in Token.objects.filter(user_id=user_id).values_list(
+                'key', flat=True):
+            token_cache.invalidate(get_digest(key))
+        for login in logins:
+            basic_cache.invalidate(get_digest(login))
+        token_cache.forget_user(user_id)
+        basic_cache.forget_user(user_id)
+
+    transaction.on_commit(invalidate)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """ TokenAuthentication без запроса к базе на каждый запрос. """
+
+    def authenticate_credentials(self, key):
+        digest = get_digest(key)
+        token = token_cache.get(digest, digest)
+        if token is None:
+            generation = token_cache.get_generation(digest)
+            user, token = super().authenticate_credentials(key)
+            token_cache.set(digest, user.pk, token, generation)
+        return token.user, token
+
+
+class CachedBasicAuthentication(BasicAuthentication):
+    """ BasicAuthentication, которая проверяет хэш пароля один раз,
+        а затем находит пользователя по HMAC учетных данных. """
+
+    def authenticate_credentials(self, userid, password, request=None):
+        digest = get_digest(f'{userid}\0{password}')
+        login_digest = get_digest(userid)
+        user = basic_cache.get(digest, login_digest)
+        if user is None:
+            generation = basic_cache.get_generation(login_digest)
+            user, _ = super().authenticate_credentials(
+                userid, password, request)
+            basic_cache.set(digest, user.pk, user, generation)
+        return user, None
@@ -0,0 +1,34 @@
+# Generated by Django 3.2.13 on 2026-10-18 17:57
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def fill_followers_count(apps, schema_editor):
+    CustomUser = apps.get_model('users', 'CustomUser')
+    Follow = apps.get_model('recipes', 'Follow')
+    CustomUser.objects.update(followers_count=Coalesce(Subquery(
+        Follow.objects.filter(
+            following=OuterRef('pk')
+        ).order_by().values('following').annotate(
+            total=Count('pk')
+        ).values('total')
+    ), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0002_counters'),
+        ('recipes', '0010_shopping_cart_ingredient'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customuser',
+            name='followers_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='Количество подписчиков'),
+        ),
+        migrations.RunPython(fill_followers_count, migrations.RunPython.noop),
+    ]
@@ -7,6 +7,12 @@ class CustomUser(AbstractUser):
     email = models.EmailField(('email address'), unique=True)
     first_name = models.CharField(max_length=20)
     last_name = models.CharField(max_length=20)
+    recipes_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Количество рецептов')
+    followers_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Количество подписчиков')
 
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['username', 'first_name', 'last_name']
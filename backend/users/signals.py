@@ -0,0 +1,31 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from .authentication import invalidate_token_auth, invalidate_user_auth
+from .models import CustomUser
+
+
+@receiver(post_delete, sender=Token)
+def token_deleted(sender, instance, **kwargs):
+    # Выход через djoser token_destroy удаляет токен пользователя.
+    invalidate_token_auth(instance.key, instance.user_id)
+
+
+@receiver(pre_save, sender=CustomUser)
+def remember_login(sender, instance, update_fields=None, **kwargs):
+    # Записи Basic по старому логину тоже нужно сбросить.
+    instance._previous_login = None
+    if instance.pk and (update_fields is None
+                        or CustomUser.USERNAME_FIELD in update_fields):
+        instance._previous_login = CustomUser.objects.filter(
+            pk=instance.pk).values_list(
+                CustomUser.USERNAME_FIELD, flat=True).first()
+
+
+@receiver([post_save, post_delete], sender=CustomUser)
+def user_changed(sender, instance, **kwargs):
+    # Смена пароля, деактивация и другие изменения пользователя.
+    logins = {instance.get_username(),
+              getattr(instance, '_previous_login', None)}
+    invalidate_user_auth(instance.pk, logins - {None})
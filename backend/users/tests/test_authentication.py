@@ -0,0 +1,156 @@
+import base64
+from unittest import mock
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from users.authentication import basic_cache, token_cache
+from users.models import CustomUser
+
+PASSWORD = 'Pass-12345'
+
+
+@override_settings(AUTH_LOCAL_CACHE_TIMEOUT=0)
+class CachedAuthenticationTest(TestCase):
+    """ Локальный кэш отключен, проверяется общий кэш и поколения. """
+
+    def setUp(self):
+        cache.clear()
+        token_cache.local.clear()
+        basic_cache.local.clear()
+        self.user = CustomUser.objects.create_user(
+            email='user@example.com', username='user', first_name='User',
+            last_name='User', password=PASSWORD)
+        self.token = Token.objects.create(user=self.user)
+
+    def token_client(self):
+        return APIClient(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def basic_client(self, email='user@example.com', password=PASSWORD):
+        credentials = base64.b64encode(
+            f'{email}:{password}'.encode()).decode()
+        return APIClient(HTTP_AUTHORIZATION=f'Basic {credentials}')
+
+    def get_me(self, client):
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get('/api/users/me/')
+        return response.status_code, queries
+
+    def auth_queries(self, queries):
+        return [query['sql'] for query in queries
+                if 'authtoken_token' in query['sql']
+                or 'FROM "users_customuser"' in query['sql']]
+
+    def test_token_cached(self):
+        client = self.token_client()
+        status, queries = self.get_me(client)
+        self.assertEqual(status, 200)
+        self.assertTrue(self.auth_queries(queries))
+        status, queries = self.get_me(client)
+        self.assertEqual(status, 200)
+        self.assertEqual(self.auth_queries(queries), [])
+
+    def test_logout_invalidates_token(self):
+        client = self.token_client()
+        self.assertEqual(self.get_me(client)[0], 200)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = client.post('/api/auth/token/logout/')
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(self.get_me(client)[0], 401)
+
+    def test_token_deleted_during_lookup(self):
+        original = TokenAuthentication.authenticate_credentials
+
+        def lookup_then_logout(auth, key):
+            result = original(auth, key)
+            with self.captureOnCommitCallbacks(execute=True):
+                Token.objects.filter(key=key).delete()
+            return result
+
+        client = self.token_client()
+        with mock.patch.object(TokenAuthentication,
+                               'authenticate_credentials',
+                               lookup_then_logout):
+            self.assertEqual(self.get_me(client)[0], 200)
+        self.assertEqual(self.get_me(client)[0], 401)
+
+    def test_deactivation_invalidates_token(self):
+        client = self.token_client()
+        self.assertEqual(self.get_me(client)[0], 200)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.is_active = False
+            self.user.save()
+        self.assertEqual(self.get_me(client)[0], 401)
+
+    def test_basic_cached(self):
+        client = self.basic_client()
+        self.assertEqual(self.get_me(client)[0], 200)
+        with mock.patch('django.contrib.auth.backends.ModelBackend'
+                        '.authenticate') as authenticate:
+            self.assertEqual(self.get_me(client)[0], 200)
+        authenticate.assert_not_called()
+        self.assertEqual(self.get_me(self.basic_client(
+            password='wrong'))[0], 401)
+
+    def test_password_change_invalidates_basic(self):
+        client = self.basic_client()
+        self.assertEqual(self.get_me(client)[0], 200)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.set_password('Other-12345')
+            self.user.save()
+        self.assertEqual(self.get_me(client)[0], 401)
+        self.assertEqual(self.get_me(self.basic_client(
+            password='Other-12345'))[0], 200)
+
+    def test_email_change_invalidates_old_login(self):
+        client = self.basic_client()
+        self.assertEqual(self.get_me(client)[0], 200)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.email = 'new@example.com'
+            self.user.save()
+        self.assertEqual(self.get_me(client)[0], 401)
+
+    def test_password_changed_during_check(self):
+        original = CustomUser.check_password
+
+        def check_then_change(user, password):
+            result = original(user, password)
+            with self.captureOnCommitCallbacks(execute=True):
+                stored = CustomUser.objects.get(pk=user.pk)
+                stored.set_password('Other-12345')
+                stored.save()
+            return result
+
+        client = self.basic_client()
+        with mock.patch.object(CustomUser, 'check_password',
+                               check_then_change):
+            self.assertEqual(self.get_me(client)[0], 200)
+        self.assertEqual(self.get_me(client)[0], 401)
+
+    @override_settings(AUTH_CACHE_TIMEOUT=60)
+    def test_invalid_credentials_leave_expiring_keys(self):
+        with mock.patch('recipes.cache.cache.add',
+                        wraps=cache.add) as add:
+            client = APIClient(HTTP_AUTHORIZATION='Token invalid')
+            self.assertEqual(self.get_me(client)[0], 401)
+            client = self.basic_client(email='nobody@example.com')
+            self.assertEqual(self.get_me(client)[0], 401)
+        self.assertEqual(add.call_count, 2)
+        for call in add.call_args_list:
+            self.assertEqual(call.args[2], 60)
+
+    @override_settings(AUTH_CACHE_TIMEOUT=60)
+    def test_expired_generation_is_a_miss(self):
+        client = self.token_client()
+        self.assertEqual(self.get_me(client)[0], 200)
+        # Ключи locmem хранятся с префиксом версии ':1:'.
+        cache.delete_many([key.split(':', 2)[2] for key in list(cache._cache)
+                           if 'auth_generation' in key])
+        status, queries = self.get_me(client)
+        self.assertEqual(status, 200)
+        self.assertTrue(self.auth_queries(queries))
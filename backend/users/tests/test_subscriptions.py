@@ -0,0 +1,38 @@
+from django.core.cache import cache
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from recipes.models import Follow
+from recipes.tests.base import make_recipe, make_user
+
+SUBSCRIPTIONS_QUERIES = 3
+
+
+class SubscriptionsQueryCountTest(TestCase):
+    """ Число запросов к подпискам не зависит от размера страницы
+        и от recipes_limit. """
+
+    def setUp(self):
+        self.user = make_user('reader')
+        for number in range(6):
+            author = make_user(f'author{number}')
+            for recipe in range(number + 1):
+                make_recipe(author, f'recipe{number}_{recipe}')
+            Follow.objects.create(user=self.user, following=author)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_page_size_and_recipes_limit(self):
+        for limit, recipes_limit in ((2, 1), (6, 5)):
+            with self.subTest(limit=limit, recipes_limit=recipes_limit):
+                cache.clear()
+                with self.assertNumQueries(SUBSCRIPTIONS_QUERIES):
+                    response = self.client.get(
+                        f'/api/users/subscriptions/?limit={limit}'
+                        f'&recipes_limit={recipes_limit}')
+                self.assertEqual(response.status_code, 200)
+                results = response.json()['results']
+                self.assertEqual(len(results), limit)
+                self.assertTrue(any(
+                    len(result['recipes']) == recipes_limit
+                    for result in results))